@@ -1,37 +1,310 @@
+import os
+import threading
 from random import choice
+from time import perf_counter
+
+from engine import evaluate
+from engine.book import OpeningBook
+from engine.move import move_to_uci
+from engine.parallel import ParallelSearcher
+from engine.search import Searcher
+from engine.tablebase import Tablebase
+
+# Evaluation weights written by tune.py, loaded by default if present
+WEIGHTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "weights.json")
+
+# Weights file loaded by load_weights(), None while the built-in weights
+# are used
+_loaded_weights = None
+
+
+def load_weights(weights=None, verbose=False):
+    """Load the evaluation weights of the bots, once.
+
+    The weights are global, and positions keep material and piece-square
+    sums made with the weights current when they were set up, so this has
+    to happen before the positions the bots play are. ChessBot calls it;
+    front ends that set up positions before their bot (uci.py) call it at
+    startup.
+
+    Args:
+        weights (str): Weights file, WEIGHTS_FILE (if it exists) if None.
+
+    """
+
+    global _loaded_weights
+    if weights is None and os.path.exists(WEIGHTS_FILE):
+        weights = WEIGHTS_FILE
+    if weights and weights != _loaded_weights:
+        evaluate.load_weights(weights)
+        _loaded_weights = weights
+        if verbose:
+            print(f"Evaluation weights from {weights}")
 
 
 class ChessBot:
 
-    def __init__(self, color):
+    def __init__(self, color, hash_mb=16, workers=1, verbose=True,
+                 book=None, tablebase=None, tablebase_pieces=None,
+                 weights=None):
 
         self.color = color
 
-        self.pieces = []
+        # Print a line about every search
+        self.verbose = verbose
+
+        # Evaluation weights file. They are global, so they apply to every
+        # bot (and position) created afterwards.
+        load_weights(weights, verbose)
+
+        # hash_mb caps the size of the transposition table (of every
+        # worker process if the search runs on more than one)
+        if workers > 1:
+            self.searcher = ParallelSearcher(workers, hash_mb)
+        else:
+            self.searcher = Searcher(hash_mb)
+
+        # Polyglot opening book (path), played from before searching
+        self.book = OpeningBook(book) if book else None
+
+        # Syzygy tablebases (directory), played from once few pieces are
+        # left; needs python-chess
+        self.tablebase = None
+        if tablebase:
+            self.tablebase = Tablebase(tablebase, tablebase_pieces)
+
+        # SearchResult of the last call to search(), None after a book or
+        # tablebase move
+        self.last_search = None
+
+        # While pondering: (key of the position expected next, start time,
+        # SearchHandle of the search of that position)
+        self.pondering = None
+
+    def random_move(self, position):
+        """Pick a random legal move for the side to move.
+
+        Returns:
+            int: Encoded move, like search().
+
+        """
+
+        return choice(position.legal_moves())
+
+    def search(self, position, time_ms=None, depth=None, stop=None,
+               progress=None):
+        """Play from the opening book or the endgame tablebases if they
+        know the position, otherwise find the best move with iterative
+        deepening alpha-beta.
+
+        Args:
+            position (Position): Position to move in.
+            time_ms (int): Hard limit for the search time in milliseconds.
+            depth (int): Depth limit, unlimited if None.
+            stop (threading.Event): Makes the search return its best move
+                so far once set.
+            progress (callable): Called with a SearchResult after every
+                completed iteration.
+
+        Returns:
+            int: Encoded move, None if there are no legal moves.
+
+        """
+
+        if self.book:
+            move = self.book.choose(position)
+            if move is not None:
+                self.stop_pondering()
+                self.last_search = None
+                if self.verbose:
+                    print(f"{move_to_uci(move)}: book")
+                return move
+
+        if self.tablebase:
+            move = self.tablebase.best_move(position)
+            if move is not None:
+                self.stop_pondering()
+                self.last_search = None
+                if self.verbose:
+                    print(f"{move_to_uci(move)}: tablebase")
+                return move
+
+        result = self._ponder_hit(position, time_ms, depth, stop)
+        hit = result is not None
+        if not hit:
+            result = self.searcher.search(position, time_ms, depth, stop,
+                                          progress)
+        self.last_search = result
+
+        if result.move is not None and self.verbose:
+            print(f"{move_to_uci(result.move)}: depth {result.depth} "
+                  f"score {result.score} nodes {result.nodes} "
+                  f"nps {result.nps} time {int(result.time * 1000)}ms"
+                  + (" (ponder hit)" if hit else ""))
 
-    def random_move(self, board):
+        return result.move
 
-        made_move = False
+    def start_search(self, position, time_ms=None, depth=None,
+                     progress=None):
+        """Like search(), but on a background thread, for callers that
+        have to stay responsive meanwhile. Only one search of a bot may
+        run at a time.
 
-        self.pieces = []
+        Returns:
+            SearchHandle: To poll, stop or cancel the search and get its
+                move.
 
-        for column in board:
-            for piece in column:
-                if piece != None:
-                    #print(piece, '\n')
-                    if piece.color == self.color:
-                        #print(f"{piece}\n{piece.color}\n")
-                        self.pieces.append(piece)
+        """
+        return SearchHandle(self.search, position, time_ms, depth, progress)
 
-        while True:
-            piece = choice(self.pieces)
-            if len(piece.moves) > 0:
+    def ponder(self, position):
+        """Think on the opponent's time: search the position after the
+        reply the last search expects, in the background, until the next
+        call to search(). Call it with the position after the bot's move.
+
+        Returns:
+            bool: True if pondering started, False if no reply is known.
+
+        """
+
+        self.stop_pondering()
+        reply = self.last_search.ponder if self.last_search else None
+        if reply is None or reply not in position.legal_moves():
+            return False
+
+        expected = position.copy()
+        expected.make_move(reply)
+        if not expected.has_legal_moves():
+            return False
+        self.pondering = (expected.key, perf_counter(), SearchHandle(
+            self.searcher.search, expected, None, None))
+        return True
+
+    def stop_pondering(self):
+        """Abandon the ponder search, if any. What it stored in the
+        transposition table stays."""
+        if self.pondering:
+            handle = self.pondering[2]
+            self.pondering = None
+            handle.cancel()
+            handle.result()
+
+    def _ponder_hit(self, position, time_ms, depth, stop):
+        """Finish pondering.
+
+        Returns:
+            SearchResult: Of the ponder search if it searched the given
+                position, None otherwise (the ponder search is dropped).
+
+        """
+
+        if self.pondering is None:
+            return None
+        key, start, handle = self.pondering
+        if key != position.key or depth is not None:
+            self.stop_pondering()
+            return None
+        self.pondering = None
+
+        # The search has been running since the bot's last move; give it
+        # the rest of the time budget, counted from then.
+        deadline = None if time_ms is None else start + time_ms / 1000
+        while not handle.done():
+            if deadline is not None and perf_counter() >= deadline:
                 break
-        
+            if stop is not None and stop.is_set():
+                break
+            handle.result(0.01)
+        handle.stop()
+        return handle.result()
+
+    def close(self):
+        """Stop the worker processes of a parallel search, if any, and
+        close the opening book and tablebases."""
+        self.stop_pondering()
+        if isinstance(self.searcher, ParallelSearcher):
+            self.searcher.close()
+        if self.book:
+            self.book.close()
+        if self.tablebase:
+            self.tablebase.close()
+
+
+class SearchHandle:
+    """A search running on a background thread, see
+    ChessBot.start_search().
+
+    The thread searches a copy of the position, so the caller can keep
+    using its own.
+
+    Args:
+        search (callable): ChessBot.search or a searcher's search method.
+        position, time_ms, depth: Its arguments.
+        progress (callable): Called with the SearchResult of every
+            completed iteration.
+
+    """
+
+    def __init__(self, search, position, time_ms, depth, progress=None):
+
+        # SearchResult of the last completed iteration, None before the
+        # first one
+        self.info = None
+
+        self._progress = progress
+        self._stop = threading.Event()
+        self._cancelled = False
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, args=(search, position.copy(), time_ms, depth),
+            daemon=True)
+        self._thread.start()
+
+    def _run(self, search, position, time_ms, depth):
+        try:
+            self._result = search(position, time_ms, depth, self._stop,
+                                  self._report)
+        except Exception as error:
+            self._error = error
+
+    def _report(self, result):
+        self.info = result
+        if self._progress is not None:
+            self._progress(result)
+
+    def done(self):
+        """True once the search has finished."""
+        return not self._thread.is_alive()
+
+    def stop(self):
+        """End the search early ("move now"); result() returns the best
+        move found so far."""
+        self._stop.set()
+
+    def cancel(self):
+        """End the search and discard its result."""
+        self._cancelled = True
+        self._stop.set()
+
+    def result(self, timeout=None):
+        """Wait for the search to finish.
 
-        move = choice(piece.moves)
+        Args:
+            timeout (float): Seconds to wait at most, forever if None.
 
-        #print(f"{piece}\n{piece.color}, {piece.pos}-{move}\n")
+        Returns:
+            int or SearchResult: What the search returned (the encoded
+                move for ChessBot.search, None without legal moves), None
+                if the search was cancelled or is still running after the
+                timeout.
 
-        return piece.pos, move
+        """
 
+        self._thread.join(timeout)
+        if self._thread.is_alive() or self._cancelled:
+            return None
+        if self._error is not None:
+            raise self._error
+        return self._result
@@ -0,0 +1,11 @@
+"""Headless chess engine: position, move generation, rules and search.
+
+Pure Python without any dependency on pygame, so it can be used for
+analysis and bot games on machines without a display.
+"""
+
+from .bitboard import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from .move import encode_move, move_from, move_to, move_to_uci, promotion
+from .position import Position, Outcome
+from .search import Searcher, SearchResult
+from .parallel import ParallelSearcher
@@ -0,0 +1,104 @@
+"""Material and piece-square evaluation of many positions at once.
+
+Meant for analysing game collections and tuning, where thousands of
+positions are scored in one call. Positions are passed as NumPy arrays in
+one of two layouts:
+
+    (N, 12)        uint64 bitboards (a1 = bit 0), white pawn, knight,
+                   bishop, rook, queen, king, then the same for black
+    (N, 12, 8, 8)  0/1 planes in the same piece order, indexed
+                   [rank, file] with rank 0 = the first rank
+
+``to_bitboards`` and ``to_planes`` build them from Position objects.
+Needs NumPy (``pip install numpy``); the rest of the engine doesn't.
+"""
+
+from .bitboard import WHITE, BLACK
+from . import evaluate
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PIECE_ORDER = [color << 3 | kind for color in (WHITE, BLACK)
+               for kind in range(6)]
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("batched evaluation needs NumPy (pip install numpy)")
+
+
+def to_bitboards(positions):
+    """Stack the bitboards of some positions into an (N, 12) uint64 array."""
+
+    _require_numpy()
+    return np.array([[position.bitboards[code >> 3][code & 7]
+                      for code in PIECE_ORDER]
+                     for position in positions], dtype=np.uint64)
+
+
+def to_planes(positions):
+    """Stack some positions into an (N, 12, 8, 8) uint8 array of planes."""
+
+    return _unpack(to_bitboards(positions)).reshape(-1, 12, 8, 8)
+
+
+def _unpack(bitboards):
+    """(N, 12) uint64 bitboards to (N, 12, 64) 0/1 uint8 squares."""
+    data = np.ascontiguousarray(bitboards, dtype="<u8")
+    return np.unpackbits(data.view(np.uint8), axis=-1,
+                         bitorder="little").reshape(-1, 12, 64)
+
+
+def _weights():
+    """(768, 3) weights: middlegame, endgame and phase for every piece
+    and square.
+
+    Built from the current tables in engine.evaluate on every call, so
+    changes to them are picked up. Floats, so that the product goes
+    through BLAS; the sums are small integers and stay exact.
+    """
+    weights = [(evaluate.MG_SQUARE_VALUES[code][sq],
+                evaluate.EG_SQUARE_VALUES[code][sq],
+                evaluate.PHASE_WEIGHTS[code & 7])
+               for code in PIECE_ORDER for sq in range(64)]
+    return np.array(weights, dtype=np.float64)
+
+
+def evaluate_batch(boards):
+    """Tapered material and piece-square score of every position.
+
+    This is the incrementally kept part of evaluate.evaluate
+    (Position.mg/eg/phase), without pawn structure, mobility and king
+    safety.
+
+    Args:
+        boards (numpy.ndarray): (N, 12) bitboards or (N, 12, 8, 8) planes,
+            see the module docstring.
+
+    Returns:
+        numpy.ndarray: (N,) int64 scores in centipawns from white's point
+            of view.
+
+    Raises:
+        ValueError: If the array has neither shape.
+
+    """
+
+    _require_numpy()
+    boards = np.asarray(boards)
+    if boards.ndim == 2 and boards.shape[1] == 12:
+        squares = _unpack(boards)
+    elif boards.ndim == 4 and boards.shape[1:] == (12, 8, 8):
+        squares = boards.reshape(-1, 12, 64)
+    else:
+        raise ValueError(f"expected an (N, 12) or (N, 12, 8, 8) array, "
+                         f"got shape {boards.shape}")
+
+    flat = squares.reshape(len(squares), -1).astype(np.float64)
+    mg, eg, phase = np.rint(flat @ _weights()).astype(np.int64).T
+    phase = np.minimum(phase, evaluate.MAX_PHASE)
+    return (mg * phase + eg * (evaluate.MAX_PHASE - phase)) \
+        // evaluate.MAX_PHASE
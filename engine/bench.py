@@ -0,0 +1,163 @@
+"""Engine benchmarks.
+
+By default, how the parallel search scales with the worker count: a fixed
+set of positions is searched to a fixed depth with 1, 2, ... N worker
+processes, reporting time, nodes per second and the speedup over the
+serial Searcher. The workers search every root move from empty tables (see
+ParallelSearcher), so one worker is slower than the serial search and
+more workers first have to make up for that. With --eval, the speed of
+the static evaluation instead, and of the batched NumPy material
+evaluation against a loop over the positions.
+
+    python -m engine.bench --workers 4 --depth 5
+    python -m engine.bench --eval
+"""
+
+import argparse
+import multiprocessing
+from random import Random
+from time import perf_counter
+
+from . import batch, evaluate
+from .bitboard import scan
+from .parallel import ParallelSearcher
+from .perft import REFERENCE_POSITIONS
+from .position import Position
+from .search import Searcher
+
+BENCH_POSITIONS = [(name, fen) for name, fen, _ in REFERENCE_POSITIONS]
+
+
+def run(searcher, depth):
+    """Search every benchmark position.
+
+    Returns:
+        tuple: (best moves, total nodes, total seconds)
+
+    """
+
+    moves, nodes, elapsed = [], 0, 0
+    for _, fen in BENCH_POSITIONS:
+        result = searcher.search(Position.from_fen(fen), depth=depth)
+        moves.append((result.move, result.score))
+        nodes += result.nodes
+        elapsed += result.time
+    return moves, nodes, elapsed
+
+
+def random_positions(count, seed=0):
+    """Positions from random games, so that all phases are represented."""
+
+    rng = Random(seed)
+    positions = []
+    while len(positions) < count:
+        position = Position.initial()
+        for _ in range(rng.randrange(10, 150)):
+            moves = position.legal_moves()
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+        positions.append(position)
+    return positions
+
+
+def eval_speed(positions, repeat=5):
+    """Print evaluations per second, first with an empty pawn structure
+    cache and then with a warm one."""
+
+    for label, rounds in (("cold pawn cache", 1),
+                          ("warm pawn cache", repeat)):
+        if rounds == 1:
+            evaluate._pawn_cache.clear()
+        start = perf_counter()
+        for _ in range(rounds):
+            for position in positions:
+                evaluate.evaluate(position)
+        elapsed = perf_counter() - start
+        print(f"{label}: {int(len(positions) * rounds / elapsed)} evals/s")
+
+
+def _material(position):
+    """Tapered material and piece-square score, one position at a time."""
+
+    mg = eg = phase = 0
+    for code in batch.PIECE_ORDER:
+        for sq in scan(position.bitboards[code >> 3][code & 7]):
+            mg += evaluate.MG_SQUARE_VALUES[code][sq]
+            eg += evaluate.EG_SQUARE_VALUES[code][sq]
+            phase += evaluate.PHASE_WEIGHTS[code & 7]
+    phase = min(phase, evaluate.MAX_PHASE)
+    return (mg * phase + eg * (evaluate.MAX_PHASE - phase)) \
+        // evaluate.MAX_PHASE
+
+
+def batch_speed(positions, repeat=5):
+    """Print positions per second of the material evaluation in a Python
+    loop and batched from both array layouts."""
+
+    bitboards = batch.to_bitboards(positions)
+    planes = batch.to_planes(positions)
+    expected = [_material(position) for position in positions]
+
+    for label, function in (
+            ("material, loop", lambda: [_material(p) for p in positions]),
+            ("material, batch (N, 12)",
+             lambda: batch.evaluate_batch(bitboards)),
+            ("material, batch (N, 12, 8, 8)",
+             lambda: batch.evaluate_batch(planes))):
+        start = perf_counter()
+        for _ in range(repeat):
+            scores = function()
+        elapsed = perf_counter() - start
+        same = "" if list(scores) == expected else "  RESULTS DIFFER"
+        print(f"{label}: {int(len(positions) * repeat / elapsed)} "
+              f"positions/s{same}")
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog="python -m engine.bench",
+                                     description=__doc__.splitlines()[0])
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--workers", type=int,
+                        default=multiprocessing.cpu_count(),
+                        help="largest number of worker processes")
+    parser.add_argument("--hash", type=int, default=16,
+                        help="transposition table size per worker in MB")
+    parser.add_argument("--eval", action="store_true",
+                        help="measure evaluations per second instead")
+    parser.add_argument("--positions", type=int, default=2000,
+                        help="number of random positions for --eval")
+    args = parser.parse_args(argv)
+
+    if args.eval:
+        positions = random_positions(args.positions)
+        eval_speed(positions)
+        if batch.np is not None:
+            batch_speed(positions)
+        return 0
+
+    _, nodes, baseline = run(Searcher(args.hash), args.depth)
+    print(f"serial: {baseline:.2f}s, {nodes} nodes, "
+          f"{int(nodes / baseline)} nps")
+
+    reference = None
+    for workers in range(1, args.workers + 1):
+        searcher = ParallelSearcher(workers, args.hash)
+        try:
+            moves, nodes, elapsed = run(searcher, args.depth)
+        finally:
+            searcher.close()
+
+        if reference is None:
+            reference = moves
+        same = "" if moves == reference else "  RESULTS DIFFER"
+        print(f"{workers} workers: {elapsed:.2f}s, {nodes} nodes, "
+              f"{int(nodes / elapsed)} nps, "
+              f"speedup {baseline / elapsed:.2f}{same}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
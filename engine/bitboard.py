@@ -0,0 +1,154 @@
+"""Bitboard constants, square helpers and precomputed attack tables.
+
+A bitboard is a plain Python int where bit ``n`` stands for square ``n``.
+Squares are numbered a1 = 0, b1 = 1, ..., h8 = 63. The GUI works in
+(x, y) board coordinates where (0, 0) is the top-left square a8, so
+``square()`` and ``coords()`` convert between the two.
+"""
+
+WHITE, BLACK = 0, 1
+COLOR_NAMES = ("white", "black")
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+PIECE_NAMES = ("Pawn", "Knight", "Bishop", "Rook", "Queen", "King")
+PIECE_SYMBOLS = "pnbrqk"
+
+FULL = (1 << 64) - 1
+
+BB_SQUARES = [1 << sq for sq in range(64)]
+
+BB_FILES = [0x0101010101010101 << file for file in range(8)]
+BB_RANKS = [0xFF << (8 * rank) for rank in range(8)]
+
+FILE_A, FILE_H = BB_FILES[0], BB_FILES[7]
+RANK_1, RANK_8 = BB_RANKS[0], BB_RANKS[7]
+
+A1, B1, C1, D1, E1, F1, G1, H1 = range(8)
+A8, B8, C8, D8, E8, F8, G8, H8 = range(56, 64)
+
+
+def square(x, y):
+    """Square index of GUI coordinates (x, y)."""
+    return (7 - y) * 8 + x
+
+
+def coords(sq):
+    """GUI coordinates (x, y) of a square index."""
+    return sq & 7, 7 - (sq >> 3)
+
+
+def square_name(sq):
+    return "abcdefgh"[sq & 7] + str((sq >> 3) + 1)
+
+
+def parse_square(name):
+    return "abcdefgh".index(name[0]) + 8 * (int(name[1]) - 1)
+
+
+def popcount(bb):
+    return bin(bb).count("1")
+
+
+def lsb(bb):
+    """Index of the least significant set bit."""
+    return (bb & -bb).bit_length() - 1
+
+
+def scan(bb):
+    """Yield the square of every set bit, lowest first."""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _step_attacks(sq, deltas):
+    attacks = 0
+    for delta in deltas:
+        to = sq + delta
+        # Reject steps that wrapped around the a/h files.
+        if 0 <= to < 64 and abs((to & 7) - (sq & 7)) <= 2:
+            attacks |= BB_SQUARES[to]
+    return attacks
+
+
+def _ray_attacks(sq, occupied, deltas):
+    attacks = 0
+    for delta in deltas:
+        cur = sq
+        while True:
+            to = cur + delta
+            if not 0 <= to < 64 or abs((to & 7) - (cur & 7)) > 1:
+                break
+            attacks |= BB_SQUARES[to]
+            if occupied & BB_SQUARES[to]:
+                break
+            cur = to
+    return attacks
+
+
+def _edges(sq):
+    return (((RANK_1 | RANK_8) & ~BB_RANKS[sq >> 3])
+            | ((FILE_A | FILE_H) & ~BB_FILES[sq & 7]))
+
+
+def _subsets(mask):
+    """Yield every subset of mask (carry-rippler trick)."""
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if not subset:
+            break
+
+
+KNIGHT_ATTACKS = [_step_attacks(sq, (-17, -15, -10, -6, 6, 10, 15, 17))
+                  for sq in range(64)]
+KING_ATTACKS = [_step_attacks(sq, (-9, -8, -7, -1, 1, 7, 8, 9))
+                for sq in range(64)]
+PAWN_ATTACKS = [[_step_attacks(sq, (7, 9)) for sq in range(64)],
+                [_step_attacks(sq, (-7, -9)) for sq in range(64)]]
+
+
+def _line_tables(deltas):
+    masks, tables = [], []
+    for sq in range(64):
+        mask = _ray_attacks(sq, 0, deltas) & ~_edges(sq)
+        masks.append(mask)
+        tables.append({occ: _ray_attacks(sq, occ, deltas)
+                       for occ in _subsets(mask)})
+    return masks, tables
+
+
+# Sliding attacks are looked up by the occupancy of the relevant line
+# (edges excluded, since a blocker there never changes the result).
+DIAG_MASKS, DIAG_ATTACKS = _line_tables((-9, -7, 7, 9))
+FILE_MASKS, FILE_ATTACKS = _line_tables((-8, 8))
+RANK_MASKS, RANK_ATTACKS = _line_tables((-1, 1))
+
+# Full (empty board) lines and the squares strictly between two squares.
+LINES = [[0] * 64 for _ in range(64)]
+BETWEEN = [[0] * 64 for _ in range(64)]
+for _a in range(64):
+    for _deltas in ((-9, 9), (-7, 7), (-8, 8), (-1, 1)):
+        _line = _ray_attacks(_a, 0, _deltas)
+        for _b in scan(_line):
+            LINES[_a][_b] = _line | BB_SQUARES[_a]
+            BETWEEN[_a][_b] = (_ray_attacks(_a, BB_SQUARES[_b], _deltas)
+                               & _ray_attacks(_b, BB_SQUARES[_a], _deltas))
+del _a, _b, _deltas, _line
+
+
+def bishop_attacks(sq, occupied):
+    return DIAG_ATTACKS[sq][occupied & DIAG_MASKS[sq]]
+
+
+def rook_attacks(sq, occupied):
+    return (FILE_ATTACKS[sq][occupied & FILE_MASKS[sq]]
+            | RANK_ATTACKS[sq][occupied & RANK_MASKS[sq]])
+
+
+def queen_attacks(sq, occupied):
+    return (DIAG_ATTACKS[sq][occupied & DIAG_MASKS[sq]]
+            | FILE_ATTACKS[sq][occupied & FILE_MASKS[sq]]
+            | RANK_ATTACKS[sq][occupied & RANK_MASKS[sq]])
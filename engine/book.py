@@ -0,0 +1,110 @@
+"""Polyglot opening books.
+
+A Polyglot .bin file is a list of 16-byte entries sorted by position key,
+all big-endian:
+
+    key     8 bytes  Zobrist key of the position (same as Position.key)
+    move    2 bytes  to file, to rank, from file, from rank (3 bits each,
+                     lowest first), promotion piece (0 none, 1 knight ...
+                     4 queen)
+    weight  2 bytes  how often the move should be chosen
+    learn   4 bytes  unused
+
+The file is memory-mapped and searched in place, so opening even a large
+book is instant and only the pages actually looked at are read.
+"""
+
+import mmap
+import random
+import struct
+
+from .move import CASTLING, PROMO_KNIGHT
+
+ENTRY = struct.Struct(">QHHI")
+KEY = struct.Struct(">Q")
+
+
+class OpeningBook:
+
+    def __init__(self, path):
+
+        self.path = path
+        with open(path, "rb") as f:
+            # mmap can't map empty files
+            if f.seek(0, 2):
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.data = b""
+        self.size = len(self.data) // ENTRY.size
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _first(self, key):
+        """Index of the first entry with a key not below the given one."""
+
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def entries(self, position):
+        """Book moves of the position.
+
+        Returns:
+            list: (move, weight) pairs, encoded moves that are legal in
+                the position.
+
+        """
+
+        key = position.key
+        legal = {}
+        for move in position.legal_moves():
+            frm, to, flag = move & 63, (move >> 6) & 63, move >> 12
+            if flag == CASTLING:
+                # Polyglot stores castling as the king taking its rook.
+                to = frm + 3 if to > frm else frm - 4
+            # Polyglot numbers promotions by piece type, like we do.
+            promotion = flag - 3 if flag >= PROMO_KNIGHT else 0
+            legal[to | frm << 6 | promotion << 12] = move
+
+        found = []
+        index = self._first(key)
+        while index < self.size:
+            entry_key, raw, weight, _ = ENTRY.unpack_from(
+                self.data, index * ENTRY.size)
+            if entry_key != key:
+                break
+            move = legal.get(raw & 0x7FFF)
+            if move is not None:
+                found.append((move, weight))
+            index += 1
+        return found
+
+    def choose(self, position, weighted=True, rng=random):
+        """A book move for the position, or None if it is not in the book.
+
+        With weighted, moves are picked at random in proportion to their
+        weights, otherwise the move with the highest weight is played.
+        """
+
+        entries = self.entries(position)
+        if not entries:
+            return None
+        if not weighted:
+            return max(entries, key=lambda entry: entry[1])[0]
+        moves, weights = zip(*entries)
+        if not any(weights):
+            return rng.choice(moves)
+        return rng.choices(moves, weights)[0]
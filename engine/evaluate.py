@@ -0,0 +1,375 @@
+"""Static evaluation.
+
+Scores are in centipawns from white's point of view until the very end,
+where ``evaluate`` turns them around for the side to move. Every term has
+a middlegame and an endgame value, blended by the game phase (how much
+material is left).
+
+Material and piece-square values are summed up incrementally by
+Position.put_piece/remove_piece in ``Position.mg``/``eg``, pawn structure
+is cached by pawn configuration, and mobility and king safety are read
+off the attack sets the position keeps anyway.
+
+All weights can be replaced at run time with ``set_weights`` or loaded
+from a weights file written by the tuner (tune.py) with ``load_weights``.
+
+``python -m engine.bench --eval`` reports evaluations per second.
+"""
+
+import json
+import os
+
+from .bitboard import (
+    WHITE, BLACK, PAWN, KING,
+    BB_FILES, BB_RANKS, KING_ATTACKS, scan, popcount)
+
+# Middlegame and endgame piece values
+MG_VALUES = (82, 337, 365, 477, 1025, 0)
+EG_VALUES = (94, 281, 297, 512, 936, 0)
+
+# Contribution of every piece type to the game phase (24 = opening)
+PHASE_WEIGHTS = (0, 1, 1, 2, 4, 0)
+MAX_PHASE = 24
+
+# Piece-square tables from white's point of view, a8 first (as printed
+# on a diagram), so that index 56 ^ sq is the entry of white square sq.
+_PAWN = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0)
+_PAWN_EG = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     15,  15,  15,  15,  15,  15,  15,  15,
+      5,   5,   5,   5,   5,   5,   5,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0)
+_KNIGHT = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50)
+_BISHOP = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20)
+_ROOK = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0)
+_QUEEN = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20)
+_KING = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20)
+_KING_EG = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50)
+
+MG_TABLES = (_PAWN, _KNIGHT, _BISHOP, _ROOK, _QUEEN, _KING)
+EG_TABLES = (_PAWN_EG, _KNIGHT, _BISHOP, _ROOK, _QUEEN, _KING_EG)
+
+
+def _square_values(values, tables):
+    """Piece value plus table entry, signed for the color, indexed by
+    piece code (color << 3 | kind) and square."""
+
+    square_values = [None] * 16
+    for kind in range(6):
+        table = tables[kind]
+        square_values[WHITE << 3 | kind] = [
+            values[kind] + table[56 ^ sq] for sq in range(64)]
+        square_values[BLACK << 3 | kind] = [
+            -values[kind] - table[sq] for sq in range(64)]
+    return square_values
+
+
+MG_SQUARE_VALUES = _square_values(MG_VALUES, MG_TABLES)
+EG_SQUARE_VALUES = _square_values(EG_VALUES, EG_TABLES)
+
+# Mobility: bonus per attacked square that isn't occupied by an own
+# piece, counted from the average number of such squares.
+MOBILITY_MG = (0, 4, 5, 2, 1, 0)
+MOBILITY_EG = (0, 4, 5, 4, 2, 0)
+MOBILITY_AVERAGE = (0, 4, 6, 7, 13, 0)
+
+# Pawn structure
+DOUBLED_MG, DOUBLED_EG = -10, -20
+ISOLATED_MG, ISOLATED_EG = -10, -15
+# Passed pawn bonus by rank (from the pawn's side)
+PASSED_MG = (0, 5, 10, 15, 25, 40, 60, 0)
+PASSED_EG = (0, 10, 20, 35, 55, 85, 120, 0)
+
+# King safety (middlegame only): bonus per own pawn shielding the king
+# and penalty per enemy attack on the squares around it, by attacker.
+SHIELD_BONUS = 10
+KING_ATTACK_WEIGHTS = (0, 8, 8, 12, 20, 0)
+
+PAWN_CACHE_SIZE = 1 << 14
+
+# Weights that set_weights() can replace, in weights file order
+WEIGHT_NAMES = (
+    "MG_VALUES", "EG_VALUES", "MG_TABLES", "EG_TABLES",
+    "MOBILITY_MG", "MOBILITY_EG", "DOUBLED_MG", "DOUBLED_EG",
+    "ISOLATED_MG", "ISOLATED_EG", "PASSED_MG", "PASSED_EG",
+    "SHIELD_BONUS", "KING_ATTACK_WEIGHTS")
+
+# Format version of weights files, bumped whenever WEIGHT_NAMES or the
+# meaning of a weight changes
+WEIGHTS_VERSION = 1
+
+ADJACENT_FILES = [(BB_FILES[file - 1] if file > 0 else 0)
+                   | (BB_FILES[file + 1] if file < 7 else 0)
+                   for file in range(8)]
+
+
+def _ahead(color, sq):
+    """Squares in front of sq (from color's point of view), on its file
+    and both adjacent ones."""
+    files = BB_FILES[sq & 7] | ADJACENT_FILES[sq & 7]
+    rank = sq >> 3
+    if color == WHITE:
+        return files & ~((1 << (8 * rank + 8)) - 1)
+    return files & ((1 << (8 * rank)) - 1)
+
+
+PASSED_MASKS = [[_ahead(color, sq) for sq in range(64)]
+                for color in (WHITE, BLACK)]
+
+
+def _shield(color, sq):
+    """The two ranks in front of a king, on its file and the adjacent
+    ones."""
+    rank = sq >> 3
+    ranks = (rank + 1, rank + 2) if color == WHITE else (rank - 1, rank - 2)
+    mask = 0
+    for rank in ranks:
+        if 0 <= rank < 8:
+            mask |= BB_RANKS[rank]
+    return _ahead(color, sq) & mask
+
+
+SHIELD_MASKS = [[_shield(color, sq) for sq in range(64)]
+                for color in (WHITE, BLACK)]
+
+_pawn_cache = {}
+
+
+def pawn_structure(white_pawns, black_pawns):
+    """Doubled, isolated and passed pawns.
+
+    Results are cached by the pawn bitboards, which repeat a lot more
+    often than whole positions.
+
+    Returns:
+        tuple: (middlegame, endgame) score from white's point of view.
+
+    """
+
+    key = (white_pawns, black_pawns)
+    cached = _pawn_cache.get(key)
+    if cached is not None:
+        return cached
+
+    mg = eg = 0
+    for color, pawns, enemy, sign in ((WHITE, white_pawns, black_pawns, 1),
+                                      (BLACK, black_pawns, white_pawns, -1)):
+        for file in range(8):
+            count = popcount(pawns & BB_FILES[file])
+            if count > 1:
+                mg += sign * DOUBLED_MG * (count - 1)
+                eg += sign * DOUBLED_EG * (count - 1)
+            if count and not pawns & ADJACENT_FILES[file]:
+                mg += sign * ISOLATED_MG * count
+                eg += sign * ISOLATED_EG * count
+        for sq in scan(pawns):
+            if not PASSED_MASKS[color][sq] & enemy:
+                rank = sq >> 3 if color == WHITE else 7 - (sq >> 3)
+                mg += sign * PASSED_MG[rank]
+                eg += sign * PASSED_EG[rank]
+
+    if len(_pawn_cache) >= PAWN_CACHE_SIZE:
+        _pawn_cache.clear()
+    _pawn_cache[key] = mg, eg
+    return mg, eg
+
+
+def evaluate(position):
+    """Score of the position from the side to move's point of view."""
+
+    mg, eg = position.mg, position.eg
+
+    bitboards = position.bitboards
+    pawn_mg, pawn_eg = pawn_structure(bitboards[WHITE][PAWN],
+                                      bitboards[BLACK][PAWN])
+    mg += pawn_mg
+    eg += pawn_eg
+
+    squares = position.squares
+    attacks = position.attacks
+    occupied_co = position.occupied_co
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        own = occupied_co[color]
+        bbs = bitboards[color]
+        king = bbs[KING]
+        king_sq = king.bit_length() - 1
+        enemy_zone = KING_ATTACKS[bitboards[color ^ 1][KING].bit_length() - 1]
+
+        king_attacks = 0
+        for sq in scan(own & ~bbs[PAWN] & ~king):
+            kind = squares[sq] & 7
+            targets = attacks[sq] & ~own
+            moves = popcount(targets) - MOBILITY_AVERAGE[kind]
+            mg += sign * MOBILITY_MG[kind] * moves
+            eg += sign * MOBILITY_EG[kind] * moves
+            if targets & enemy_zone:
+                king_attacks += KING_ATTACK_WEIGHTS[kind] \
+                    * popcount(targets & enemy_zone)
+
+        shield = popcount(SHIELD_MASKS[color][king_sq] & bbs[PAWN])
+        mg += sign * (SHIELD_BONUS * shield + king_attacks)
+
+    phase = min(position.phase, MAX_PHASE)
+    score = (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+    return score if position.turn == WHITE else -score
+
+
+def get_weights():
+    """The current weights as a dict of (nested) lists of ints, keyed by
+    lower case WEIGHT_NAMES."""
+
+    def to_list(value):
+        if isinstance(value, int):
+            return value
+        return [to_list(item) for item in value]
+
+    return {name.lower(): to_list(globals()[name]) for name in WEIGHT_NAMES}
+
+
+def _shape(value):
+    if isinstance(value, (list, tuple)):
+        return (len(value),) + (_shape(value[0]) if value else ())
+    return ()
+
+
+def set_weights(weights):
+    """Replace the evaluation weights.
+
+    Positions keep their material and piece-square sums in Position.mg
+    and eg, so the ones set up before still score with the old weights.
+    Set the weights first.
+
+    Args:
+        weights (dict): All weights, as returned by get_weights().
+            Floats are rounded.
+
+    Raises:
+        ValueError: If a weight is missing or has the wrong shape.
+
+    """
+
+    def to_tuple(value):
+        if isinstance(value, (list, tuple)):
+            return tuple(to_tuple(item) for item in value)
+        return int(round(value))
+
+    current = get_weights()
+    new = {}
+    for name, value in current.items():
+        if name not in weights:
+            raise ValueError(f"missing weight {name!r}")
+        if _shape(weights[name]) != _shape(value):
+            raise ValueError(f"weight {name!r} should have shape "
+                             f"{_shape(value)}, not {_shape(weights[name])}")
+        new[name] = to_tuple(weights[name])
+
+    module = globals()
+    for name, value in new.items():
+        module[name.upper()] = value
+
+    # Position imported these lists, so they are updated in place.
+    MG_SQUARE_VALUES[:] = _square_values(MG_VALUES, MG_TABLES)
+    EG_SQUARE_VALUES[:] = _square_values(EG_VALUES, EG_TABLES)
+    _pawn_cache.clear()
+
+
+def load_weights(path):
+    """Set the weights from a weights file.
+
+    Returns:
+        dict: Everything in the file (weights and what the tuner stored
+            about them).
+
+    Raises:
+        ValueError: If the file is from another format version or its
+            weights don't fit.
+
+    """
+
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != WEIGHTS_VERSION:
+        raise ValueError(f"{path}: weights format version "
+                         f"{data.get('version')}, expected {WEIGHTS_VERSION}")
+    set_weights(data["weights"])
+    return data
+
+
+def save_weights(path, weights, **info):
+    """Write a weights file.
+
+    The file is replaced in one step, so an interrupted write leaves the
+    previous one intact.
+
+    Args:
+        path (str): File to write.
+        weights (dict): Weights as returned by get_weights().
+        **info: Other JSON serializable entries to store with them.
+
+    """
+
+    data = {"version": WEIGHTS_VERSION, **info, "weights": weights}
+    temporary = path + ".tmp"
+    with open(temporary, "w") as f:
+        json.dump(data, f)
+    os.replace(temporary, path)
@@ -0,0 +1,54 @@
+"""Moves are encoded as ints: from-square, to-square and a flag.
+
+    bits  0-5   from square
+    bits  6-11  to square
+    bits 12-15  flag (NORMAL, DOUBLE_PUSH, CASTLING, EN_PASSANT or a
+                promotion flag)
+"""
+
+from .bitboard import PIECE_SYMBOLS
+from .bitboard import square_name, parse_square
+
+NORMAL, DOUBLE_PUSH, CASTLING, EN_PASSANT = range(4)
+PROMO_KNIGHT, PROMO_BISHOP, PROMO_ROOK, PROMO_QUEEN = range(4, 8)
+
+# Promotion flags are laid out so that flag - 3 is the promoted piece.
+PROMOTION_FLAGS = (PROMO_QUEEN, PROMO_ROOK, PROMO_BISHOP, PROMO_KNIGHT)
+
+NULL_MOVE = 0
+
+
+def encode_move(frm, to, flag=NORMAL):
+    return frm | (to << 6) | (flag << 12)
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return (move >> 6) & 63
+
+
+def move_flag(move):
+    return move >> 12
+
+
+def promotion(move):
+    """Piece type the move promotes to, or None."""
+    flag = move >> 12
+    return flag - 3 if flag >= PROMO_KNIGHT else None
+
+
+def move_to_uci(move):
+    uci = square_name(move & 63) + square_name((move >> 6) & 63)
+    if move >> 12 >= PROMO_KNIGHT:
+        uci += PIECE_SYMBOLS[(move >> 12) - 3]
+    return uci
+
+
+def parse_uci_squares(uci):
+    """Split a UCI move string into (from, to, promotion piece or None)."""
+    frm, to = parse_square(uci[0:2]), parse_square(uci[2:4])
+    promo = PIECE_SYMBOLS.index(uci[4]) if len(uci) > 4 else None
+    return frm, to, promo
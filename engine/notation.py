@@ -0,0 +1,108 @@
+"""Standard algebraic notation (SAN), as used in PGN files."""
+
+import re
+
+from .bitboard import PAWN, KING, PIECE_SYMBOLS, square_name, parse_square
+from .move import CASTLING, PROMO_KNIGHT
+
+SAN_REGEX = re.compile(
+    r"^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(?:=?([NBRQ]))?$")
+
+
+def move_to_san(position, move):
+    """SAN of a legal move in the given position, e.g. "Nbd7", "exd5",
+    "e8=Q+" or "O-O#"."""
+
+    frm, to, flag = move & 63, (move >> 6) & 63, move >> 12
+    kind = position.squares[frm] & 7
+
+    if flag == CASTLING:
+        san = "O-O" if to > frm else "O-O-O"
+    elif kind == PAWN:
+        san = ""
+        if frm & 7 != to & 7:  # Captures, including en passant
+            san = square_name(frm)[0] + "x"
+        san += square_name(to)
+        if flag >= PROMO_KNIGHT:
+            san += "=" + PIECE_SYMBOLS[flag - 3].upper()
+    else:
+        san = PIECE_SYMBOLS[kind].upper()
+        if kind != KING:
+            san += _disambiguation(position, move, kind)
+        if position.squares[to] is not None:
+            san += "x"
+        san += square_name(to)
+
+    position.make_move(move)
+    if position.in_check():
+        san += "+" if position.has_legal_moves() else "#"
+    position.unmake_move()
+
+    return san
+
+
+def _disambiguation(position, move, kind):
+    """File, rank or square of the origin, as far as needed to tell the
+    move apart from other moves of the same piece type to the square."""
+
+    frm, to = move & 63, (move >> 6) & 63
+    others = [other & 63 for other in position.legal_moves()
+              if (other >> 6) & 63 == to and other & 63 != frm
+              and position.squares[other & 63] & 7 == kind]
+    if not others:
+        return ""
+    name = square_name(frm)
+    if all(sq & 7 != frm & 7 for sq in others):
+        return name[0]
+    if all(sq >> 3 != frm >> 3 for sq in others):
+        return name[1]
+    return name
+
+
+def parse_san(position, san):
+    """The legal move a SAN string stands for in the given position.
+
+    Check and annotation marks are ignored, and so is a missing or
+    superfluous capture sign.
+
+    Raises:
+        ValueError: If the SAN is malformed, illegal or ambiguous.
+
+    """
+
+    text = san.rstrip("+#!?")
+    moves = position.legal_moves()
+
+    if text in ("O-O", "O-O-O", "0-0", "0-0-0"):
+        for move in moves:
+            if move >> 12 == CASTLING \
+                    and ((move >> 6) & 63 > move & 63) == (len(text) == 3):
+                return move
+        raise ValueError(f"illegal castling {san!r} in {position.fen()}")
+
+    match = SAN_REGEX.match(text)
+    if not match:
+        raise ValueError(f"invalid SAN {san!r}")
+    piece, file, rank, _, to, promoted = match.groups()
+
+    kind = PIECE_SYMBOLS.index(piece.lower()) if piece else PAWN
+    to = parse_square(to)
+    promotion = PIECE_SYMBOLS.index(promoted.lower()) if promoted else None
+
+    found = []
+    for move in moves:
+        frm, flag = move & 63, move >> 12
+        if (move >> 6) & 63 != to or position.squares[frm] & 7 != kind:
+            continue
+        if file and "abcdefgh"[frm & 7] != file:
+            continue
+        if rank and str((frm >> 3) + 1) != rank:
+            continue
+        if (flag - 3 if flag >= PROMO_KNIGHT else None) != promotion:
+            continue
+        found.append(move)
+
+    if len(found) != 1:
+        problem = "illegal" if not found else "ambiguous"
+        raise ValueError(f"{problem} move {san!r} in {position.fen()}")
+    return found[0]
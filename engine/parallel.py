@@ -0,0 +1,215 @@
+"""Root-splitting parallel search on a multiprocessing pool.
+
+Every iteration of the iterative deepening hands the root moves out to
+the worker processes, each of which searches the position after its move
+with its own Searcher. The main process only collects the scores, so no
+state has to be shared between the workers.
+"""
+
+import multiprocessing
+from itertools import count
+from time import perf_counter
+
+from . import evaluate
+from .search import (
+    Searcher, SearchResult, SearchTimeout, INFINITY, MAX_PLY, MATE_BOUND)
+
+# Searcher of the current worker process, see _init_worker()
+_searcher = None
+_search_id = None
+_generation = 0
+
+
+def _init_worker(hash_mb, weights, stop):
+    global _searcher
+    # Workers that weren't forked start with the built-in weights.
+    evaluate.set_weights(weights)
+    _searcher = Searcher(hash_mb)
+    # Shared with the main process, which sets it to stop a search
+    _searcher.stop_event = stop
+
+
+def _search_root_move(task):
+    """Score one root move in a worker process.
+
+    Returns:
+        tuple: (score, nodes, reply), score is None if the time ran out
+            or the search was stopped. With an alpha, the move is first
+            searched with a null window and only searched again if it
+            beats alpha, so scores not above alpha are just upper bounds.
+            reply is the best answer to the move found, None if unknown.
+
+    """
+
+    global _search_id, _generation
+
+    position, move, depth, alpha, deadline, search_id, generation = task
+    searcher = _searcher
+
+    # Tasks still queued when the search is stopped are skipped.
+    if searcher.stop_event.is_set():
+        return None, 0, None
+
+    # Fixed-depth searches (search_id None) start from empty tables so
+    # that a move's score doesn't depend on which worker searched what
+    # before it. Timed searches keep them for the whole search, and
+    # ParallelSearcher.clear() empties them at the next task.
+    if search_id is None or generation != _generation:
+        searcher.clear()
+    elif search_id != _search_id:
+        searcher.new_search()
+    _search_id, _generation = search_id, generation
+
+    # The deadline is shared by all root moves; perf_counter() is the
+    # same system-wide clock in every process.
+    searcher.nodes = 0
+    searcher.deadline = deadline
+
+    # The position is this task's own (unpickled) copy, it is not
+    # restored afterwards.
+    position.make_move(move)
+    try:
+        if alpha > -INFINITY:
+            score = -searcher._negamax(
+                position, depth - 1, -alpha - 1, -alpha, 1)
+        if alpha == -INFINITY or score > alpha:
+            score = -searcher._negamax(
+                position, depth - 1, -INFINITY, -alpha, 1)
+    except SearchTimeout:
+        score = None
+
+    entry = searcher.tt.probe(position.key)
+    reply = entry[0] if entry and entry[0] else None
+    return score, searcher.nodes, reply
+
+
+class ParallelSearcher:
+    """Searches the root moves of a position in parallel worker processes.
+
+    Fixed-depth searches are deterministic: the best move and score only
+    depend on the position and the depth, not on the number of workers or
+    the order in which they finish. The price is that the workers search
+    every root move from empty tables, so nothing learned in one iteration
+    or under another root move is reused: one worker searches more nodes
+    than a serial Searcher, and more slowly (see engine.bench). Timed
+    searches keep the tables and don't pay it.
+    """
+
+    def __init__(self, workers=None, hash_mb=16):
+
+        self.workers = workers or multiprocessing.cpu_count()
+
+        # Every worker has a transposition table of hash_mb and evaluates
+        # with the weights current at this point.
+        self._stop = multiprocessing.Event()
+        self.pool = multiprocessing.Pool(
+            self.workers, _init_worker,
+            (hash_mb, evaluate.get_weights(), self._stop))
+
+        # Only for ordering the root moves; it never searches, so its
+        # table is kept at the smallest size.
+        self._orderer = Searcher(0)
+
+        self.nodes = 0
+        self._search_ids = count()
+        self._generation = 0
+
+    def clear(self):
+        """Forget everything learned in earlier searches.
+
+        The workers empty their tables when they get their next task.
+        """
+        self._generation += 1
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def search(self, position, time_ms=None, depth=None, stop=None,
+               progress=None):
+        """Search the position until the time budget or the depth runs out.
+
+        Same arguments and result as Searcher.search.
+        """
+
+        start = perf_counter()
+        deadline = None if time_ms is None else start + time_ms / 1000
+        self.nodes = 0
+        max_depth = MAX_PLY - 1 if depth is None else depth
+        search_id = None if time_ms is None and stop is None \
+            else next(self._search_ids)
+        self._stop.clear()
+
+        # Captures and promotions first, as in Searcher; if no iteration
+        # finishes, the first move is played.
+        root_moves = self._orderer._legal_root_moves(position)
+        best_move = root_moves[0] if root_moves else None
+        best_score = best_depth = 0
+        best_reply = None
+
+        for cur_depth in range(1, max_depth + 1):
+            if len(root_moves) <= 1:
+                break
+            try:
+                # The best move so far is searched first, the others only
+                # have to prove they are better.
+                first = self._scores(position, root_moves[:1], cur_depth,
+                                     -INFINITY, deadline, search_id, stop)
+                scores = first + self._scores(
+                    position, root_moves[1:], cur_depth, first[0][0],
+                    deadline, search_id, stop)
+            except SearchTimeout:
+                break
+
+            # Best move first, ties go to the earlier move (sort is stable)
+            order = sorted(range(len(root_moves)),
+                           key=lambda i: -scores[i][0])
+            root_moves = [root_moves[i] for i in order]
+            best_move, best_depth = root_moves[0], cur_depth
+            best_score, best_reply = scores[order[0]]
+
+            elapsed = perf_counter() - start
+            if progress is not None:
+                progress(SearchResult(
+                    best_move, best_score, cur_depth, self.nodes, elapsed,
+                    int(self.nodes / elapsed) if elapsed else 0, best_reply))
+
+            if abs(best_score) >= MATE_BOUND:
+                break
+            if deadline is not None and \
+                    perf_counter() + 2 * elapsed > deadline:
+                break
+
+        elapsed = perf_counter() - start
+        nps = int(self.nodes / elapsed) if elapsed else 0
+        return SearchResult(best_move, best_score, best_depth, self.nodes,
+                            elapsed, nps, best_reply)
+
+    def _scores(self, position, moves, depth, alpha, deadline, search_id,
+                stop=None):
+        """Score and best reply of every root move, searched in the
+        worker processes.
+
+        Raises:
+            SearchTimeout: If any of the searches ran out of time.
+
+        """
+
+        tasks = [(position, move, depth, alpha, deadline, search_id,
+                  self._generation) for move in moves]
+        pending = self.pool.map_async(_search_root_move, tasks, chunksize=1)
+        if stop is not None or deadline is not None:
+            # Pass the stop on to the workers. The running tasks watch the
+            # deadline themselves, the queued ones are skipped through
+            # the stop event once it has passed.
+            while not pending.ready():
+                pending.wait(0.01)
+                if (stop is not None and stop.is_set()) or \
+                        (deadline is not None and perf_counter() > deadline):
+                    self._stop.set()
+        results = pending.get()
+
+        self.nodes += sum(nodes for _, nodes, _ in results)
+        if any(score is None for score, _, _ in results):
+            raise SearchTimeout
+        return [(score, reply) for score, _, reply in results]
@@ -0,0 +1,138 @@
+"""Perft: count the leaf nodes of the legal move tree to a given depth.
+
+Used to check the move generator against known node counts and to
+benchmark it:
+
+    python -m engine.perft 4
+    python -m engine.perft --fen "<FEN>" --divide 3
+    python -m engine.perft --check
+"""
+
+import argparse
+from time import perf_counter
+
+from .move import move_to_uci
+from .position import Position, START_FEN
+
+# Reference positions with their node counts at depth 1, 2, ...
+REFERENCE_POSITIONS = (
+    ("start position", START_FEN,
+     (20, 400, 8902, 197281, 4865609)),
+    ("kiwipete",
+     "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     (48, 2039, 97862, 4085603)),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     (14, 191, 2812, 43238, 674624)),
+    ("position 4",
+     "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     (6, 264, 9467, 422333)),
+    ("position 5",
+     "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     (44, 1486, 62379, 2103487)),
+    ("position 6",
+     "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - "
+     "0 10",
+     (46, 2079, 89890, 3894594)),
+)
+
+
+def perft(position, depth):
+    """Number of leaf nodes of the legal move tree of the given depth."""
+
+    if depth == 0:
+        return 1
+
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move()
+    return nodes
+
+
+def divide(position, depth):
+    """Perft split up by root move.
+
+    Returns:
+        dict: Leaf node count below every legal root move (UCI notation).
+
+    """
+
+    return {move_to_uci(move): _subtree(position, move, depth)
+            for move in position.legal_moves()}
+
+
+def _subtree(position, move, depth):
+    position.make_move(move)
+    nodes = perft(position, depth - 1)
+    position.unmake_move()
+    return nodes
+
+
+def check(max_nodes=1000000, out=print):
+    """Run perft on all reference positions, for every depth with at most
+    max_nodes leaves.
+
+    Returns:
+        bool: True if all node counts matched.
+
+    """
+
+    ok = True
+    for name, fen, counts in REFERENCE_POSITIONS:
+        for depth, expected in enumerate(counts, 1):
+            if expected > max_nodes:
+                break
+            start = perf_counter()
+            nodes = perft(Position.from_fen(fen), depth)
+            elapsed = perf_counter() - start
+            if nodes == expected:
+                status = "ok"
+            else:
+                status = f"FAIL (expected {expected})"
+                ok = False
+            out(f"{name}, depth {depth}: {nodes} nodes, "
+                f"{int(nodes / elapsed)} nps  {status}")
+    return ok
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog="python -m engine.perft",
+                                     description=__doc__.splitlines()[0])
+    parser.add_argument("depth", type=int, nargs="?", default=3)
+    parser.add_argument("--fen", default=START_FEN)
+    parser.add_argument("--divide", action="store_true",
+                        help="print the node count below every root move")
+    parser.add_argument("--check", action="store_true",
+                        help="verify the reference positions instead")
+    parser.add_argument("--max-nodes", type=int, default=1000000,
+                        help="largest node count to verify with --check")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return 0 if check(args.max_nodes) else 1
+
+    position = Position.from_fen(args.fen)
+    start = perf_counter()
+    if args.divide:
+        counts = divide(position, args.depth)
+        for uci, nodes in sorted(counts.items()):
+            print(f"{uci}: {nodes}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(position, args.depth)
+    elapsed = perf_counter() - start
+
+    print(f"Nodes: {nodes}")
+    print(f"Time: {elapsed:.3f}s")
+    print(f"NPS: {int(nodes / elapsed) if elapsed else 0}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
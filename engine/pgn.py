@@ -0,0 +1,178 @@
+"""Reading and writing games in PGN (Portable Game Notation)."""
+
+import re
+from array import array
+from collections import namedtuple
+
+from .bitboard import WHITE
+from .notation import move_to_san, parse_san
+from .position import Position, START_FEN
+
+# Tags every PGN game starts with, in this order
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black",
+                    "Result")
+
+LINE_LENGTH = 79
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+# Greedy, so that unescaped quotes in tag values (which some programs
+# write) still work.
+TAG_REGEX = re.compile(r'^\[(\w+)\s+"(.*)"\s*\]')
+
+# Movetext tokens: comments, variations, NAGs, move numbers and moves
+TOKEN_REGEX = re.compile(
+    r"\{[^}]*\}?|;.*|\(|\)|\$\d+|\d+\.+|[^\s(){};]+")
+
+Game = namedtuple("Game", "headers moves result error")
+
+
+def _tag(name, value):
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'[{name} "{value}"]'
+
+
+def game_to_pgn(position, moves, headers, result="*"):
+    """Format a game as PGN text.
+
+    Args:
+        position (Position): Position the moves start from, restored on
+            return.
+        moves (iterable): Encoded moves of the game.
+        headers (dict): Tag pairs. Missing tags of the seven tag roster
+            are filled in with "?".
+        result (str): "1-0", "0-1", "1/2-1/2" or "*".
+
+    Games that don't start from the initial position get FEN and SetUp
+    tags.
+
+    Returns:
+        str: The game, ending with a blank line.
+
+    """
+
+    tags = dict(headers, Result=result)
+    if position.fen() != START_FEN:
+        tags.update(SetUp="1", FEN=position.fen())
+    lines = [_tag(name, tags.get(name, "?")) for name in SEVEN_TAG_ROSTER]
+    lines += [_tag(name, value) for name, value in tags.items()
+              if name not in SEVEN_TAG_ROSTER]
+    lines.append("")
+
+    tokens = []
+    for move in moves:
+        if position.turn == WHITE:
+            tokens.append(f"{position.fullmove_number}.")
+        elif not tokens:
+            tokens.append(f"{position.fullmove_number}...")
+        tokens.append(move_to_san(position, move))
+        position.make_move(move)
+    tokens.append(result)
+    for _ in moves:
+        position.unmake_move()
+
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+
+    return "\n".join(lines) + "\n\n"
+
+
+def read_games(lines):
+    """Stream the games of a PGN file one by one.
+
+    Only the current game is held in memory, so files of any size can be
+    read from an open file object (or any other iterable of lines).
+    Every move is replayed on a Position, so moves are checked for
+    legality; variations, comments and NAGs are skipped.
+
+    Yields:
+        Game: headers (dict), moves (array('H') of encoded moves), result and
+            error, the message of the first illegal or unreadable move
+            (the moves up to it are kept) or None.
+
+    """
+
+    headers, movetext = {}, []
+    blank = False  # A blank line since the last tag
+    comment = False  # Inside a {...} comment spanning lines
+    for line in lines:
+        line = line.strip()
+        if comment:
+            movetext.append(line)
+            comment = _comment_open(line, True)
+        elif line.startswith("["):
+            # A tag after movetext, or after the blank line ending the
+            # tags of a game without moves, starts the next game.
+            if movetext or headers and blank:
+                yield _parse_game(headers, movetext)
+                headers, movetext = {}, []
+            blank = False
+            match = TAG_REGEX.match(line)
+            if match:
+                headers[match.group(1)] = re.sub(
+                    r"\\(.)", r"\1", match.group(2))
+        elif not line:
+            blank = True
+        elif not line.startswith("%"):
+            movetext.append(line)
+            comment = _comment_open(line, False)
+
+    if headers or movetext:
+        yield _parse_game(headers, movetext)
+
+
+def _comment_open(line, comment):
+    """Whether a {...} comment is open at the end of a line of movetext,
+    given whether one was at its start."""
+
+    if not comment and "{" not in line:
+        return False
+    if comment and "}" not in line:
+        return True
+    for char in line:
+        if comment:
+            comment = char != "}"
+        elif char == "{":
+            comment = True
+        elif char == ";":
+            break  # The rest of the line is a comment
+    return comment
+
+
+def _parse_game(headers, movetext):
+
+    try:
+        position = Position.from_fen(headers.get("FEN", START_FEN))
+    except ValueError as e:
+        return Game(headers, [], headers.get("Result", "*"), str(e))
+
+    moves = array("H")
+    result = headers.get("Result", "*")
+    error = None
+    depth = 0  # Nesting of variations
+    for token in TOKEN_REGEX.findall("\n".join(movetext)):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth = max(0, depth - 1)
+        elif depth or token[0] in "{;$" or token[0].isdigit() \
+                and token.rstrip(".").isdigit():
+            continue
+        elif token in RESULTS:
+            result = token
+        elif error is None:
+            try:
+                move = parse_san(position, token)
+            except ValueError as e:
+                error = str(e)
+                continue
+            position.make_move(move)
+            moves.append(move)
+
+    return Game(headers, moves, result, error)
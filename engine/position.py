@@ -0,0 +1,782 @@
+from array import array
+from collections import namedtuple
+
+from .bitboard import (
+    WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, FULL,
+    BB_SQUARES, BB_RANKS, FILE_A, FILE_H, RANK_1, RANK_8,
+    A1, B1, C1, D1, E1, F1, G1, H1, A8, B8, C8, D8, E8, F8, G8, H8,
+    KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, LINES, BETWEEN,
+    PIECE_SYMBOLS, bishop_attacks, rook_attacks, queen_attacks, scan, lsb,
+    popcount, parse_square, square_name,
+)
+from .move import (
+    DOUBLE_PUSH, CASTLING, EN_PASSANT, PROMO_KNIGHT, PROMOTION_FLAGS)
+from .evaluate import MG_SQUARE_VALUES, EG_SQUARE_VALUES, PHASE_WEIGHTS
+from .zobrist import (
+    PIECE_KEYS, CASTLING_KEYS, EP_KEYS, TURN_KEY, compute_key)
+
+# Castling rights bits
+WHITE_OO, WHITE_OOO, BLACK_OO, BLACK_OOO = 1, 2, 4, 8
+CASTLING_SYMBOLS = {"K": WHITE_OO, "Q": WHITE_OOO,
+                    "k": BLACK_OO, "q": BLACK_OOO}
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+BACK_RANK = (ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK)
+
+# color, king from, king to, rook from, rook to, squares that must be
+# empty, squares the king passes (must not be attacked), castling right
+CASTLES = (
+    (WHITE, E1, G1, H1, F1, BB_SQUARES[F1] | BB_SQUARES[G1],
+     (E1, F1, G1), WHITE_OO),
+    (WHITE, E1, C1, A1, D1, BB_SQUARES[B1] | BB_SQUARES[C1] | BB_SQUARES[D1],
+     (E1, D1, C1), WHITE_OOO),
+    (BLACK, E8, G8, H8, F8, BB_SQUARES[F8] | BB_SQUARES[G8],
+     (E8, F8, G8), BLACK_OO),
+    (BLACK, E8, C8, A8, D8, BB_SQUARES[B8] | BB_SQUARES[C8] | BB_SQUARES[D8],
+     (E8, D8, C8), BLACK_OOO),
+)
+
+# Rights kept when a move touches a square (king or rook leaving or a
+# rook being captured).
+CASTLING_KEPT = [15] * 64
+CASTLING_KEPT[E1] &= ~(WHITE_OO | WHITE_OOO)
+CASTLING_KEPT[H1] &= ~WHITE_OO
+CASTLING_KEPT[A1] &= ~WHITE_OOO
+CASTLING_KEPT[E8] &= ~(BLACK_OO | BLACK_OOO)
+CASTLING_KEPT[H8] &= ~BLACK_OO
+CASTLING_KEPT[A8] &= ~BLACK_OOO
+
+# Rook from/to squares by king destination of a castling move
+CASTLING_ROOK = {G1: (H1, F1), C1: (A1, D1), G8: (H8, F8), C8: (A8, D8)}
+
+# Ways a game can end
+CHECKMATE = "checkmate"
+STALEMATE = "stalemate"
+INSUFFICIENT_MATERIAL = "insufficient material"
+FIFTY_MOVES = "fifty-move rule"
+THREEFOLD_REPETITION = "threefold repetition"
+
+LIGHT_SQUARES = 0x55AA55AA55AA55AA
+
+
+class Outcome(namedtuple("Outcome", "termination winner")):
+    """How a game ended; winner is WHITE, BLACK or None for a draw."""
+
+    __slots__ = ()
+
+    def result(self):
+        return {WHITE: "1-0", BLACK: "0-1", None: "1/2-1/2"}[self.winner]
+
+
+def piece_code(color, kind):
+    """Mailbox entry for a piece: color in bit 3, piece type in bits 0-2."""
+    return color << 3 | kind
+
+
+class Position:
+    """Chess position stored as one bitboard per color and piece type.
+
+    A 64-entry mailbox (``squares``) mirrors the bitboards so that the
+    piece on a given square can be read without scanning them.
+
+    ``attacks`` holds the attack set of the piece on every square. It is
+    kept up to date by ``make_move``, which only recomputes the pieces
+    whose square or sliding rays were touched by the move, so move
+    generation never has to redo the sliding-piece lookups of untouched
+    pieces. The union of those sets per color (``attacked_by``) is built
+    from them on first use after a move and cached until the next one.
+    """
+
+    def __init__(self):
+
+        self.bitboards = [[0] * 6, [0] * 6]  # [color][piece type]
+        self.occupied_co = [0, 0]
+        self.occupied = 0
+
+        self.squares = [None] * 64  # piece_code() or None
+        self.attacks = [0] * 64
+        self._attacked = [None, None]  # attacked_by() cache per color
+
+        # Material and piece-square sums for the evaluation (white's
+        # point of view) and the game phase, kept by put/remove_piece
+        self.mg = self.eg = 0
+        self.phase = 0
+
+        self.turn = WHITE
+        self.castling = 0
+        self.ep_square = None  # Square a pawn may capture to en passant
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+
+        # One packed int per played move, see make_move()
+        self.undo_stack = array("Q")
+
+        self.key = compute_key(self)  # Zobrist key, kept incrementally
+        # Keys of the positions before each move
+        self.key_stack = array("Q")
+        self.repetitions = {self.key: 1}  # Occurrences of every key
+
+    @classmethod
+    def initial(cls):
+        """The standard starting position."""
+        position = cls()
+        for file, kind in enumerate(BACK_RANK):
+            position.put_piece(file, WHITE, kind)
+            position.put_piece(8 + file, WHITE, PAWN)
+            position.put_piece(48 + file, BLACK, PAWN)
+            position.put_piece(56 + file, BLACK, kind)
+        position.castling = WHITE_OO | WHITE_OOO | BLACK_OO | BLACK_OOO
+        position.refresh_attacks()
+        position.refresh_key()
+        return position
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Set up a position from a FEN string.
+
+        Raises:
+            ValueError: If the FEN is malformed.
+
+        """
+
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"incomplete FEN: {fen!r}")
+        placement, turn, castling, ep_square = fields[:4]
+
+        position = cls()
+
+        ranks = placement.split("/")
+        if len(ranks) != 8:
+            raise ValueError(f"FEN needs 8 ranks: {fen!r}")
+        for rank, row in zip(range(7, -1, -1), ranks):
+            file = 0
+            for char in row:
+                if char.isdigit():
+                    file += int(char)
+                elif char.lower() in PIECE_SYMBOLS and file < 8:
+                    color = WHITE if char.isupper() else BLACK
+                    kind = PIECE_SYMBOLS.index(char.lower())
+                    position.put_piece(rank * 8 + file, color, kind)
+                    file += 1
+                else:
+                    raise ValueError(f"bad rank {row!r} in FEN: {fen!r}")
+            if file != 8:
+                raise ValueError(f"bad rank {row!r} in FEN: {fen!r}")
+        # Everything from check detection to the evaluation needs the
+        # king squares.
+        for color in (WHITE, BLACK):
+            if popcount(position.bitboards[color][KING]) != 1:
+                raise ValueError(f"FEN needs one king per side: {fen!r}")
+
+        if turn not in ("w", "b"):
+            raise ValueError(f"bad side to move in FEN: {fen!r}")
+        position.turn = WHITE if turn == "w" else BLACK
+
+        for char in castling:
+            if char not in CASTLING_SYMBOLS and castling != "-":
+                raise ValueError(f"bad castling rights in FEN: {fen!r}")
+            position.castling |= CASTLING_SYMBOLS.get(char, 0)
+        # Like the en passant square, rights without the king and rook on
+        # their home squares are dropped; make_move relies on them.
+        for color, king, _, rook, _, _, _, right in CASTLES:
+            if position.squares[king] != color << 3 | KING or \
+                    position.squares[rook] != color << 3 | ROOK:
+                position.castling &= ~right
+
+        if ep_square != "-":
+            if len(ep_square) != 2 or ep_square[0] not in "abcdefgh" \
+                    or ep_square[1] not in "12345678":
+                raise ValueError(f"bad en passant square in FEN: {fen!r}")
+            ep_square = parse_square(ep_square)
+            # Like make_move, only keep it if a pawn can capture there.
+            pawns = position.bitboards[position.turn][PAWN]
+            if PAWN_ATTACKS[position.turn ^ 1][ep_square] & pawns:
+                position.ep_square = ep_square
+
+        if len(fields) >= 6:
+            position.halfmove_clock = int(fields[4])
+            position.fullmove_number = int(fields[5])
+
+        position.refresh_attacks()
+        position.refresh_key()
+        return position
+
+    def fen(self):
+        """FEN string of the position.
+
+        The en passant square is only written if a pawn stands next to
+        the pawn that just moved two squares (as for the Zobrist key,
+        the capture doesn't have to be legal).
+        """
+
+        rows = []
+        for rank in range(7, -1, -1):
+            row, empty = "", 0
+            for sq in range(rank * 8, rank * 8 + 8):
+                code = self.squares[sq]
+                if code is None:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                symbol = PIECE_SYMBOLS[code & 7]
+                row += symbol.upper() if code >> 3 == WHITE else symbol
+            rows.append(row + (str(empty) if empty else ""))
+
+        castling = "".join(symbol for symbol, right in CASTLING_SYMBOLS.items()
+                           if self.castling & right) or "-"
+        ep_square = ("-" if self.ep_square is None
+                     else square_name(self.ep_square))
+
+        return (f"{'/'.join(rows)} {'wb'[self.turn]} {castling} {ep_square} "
+                f"{self.halfmove_clock} {self.fullmove_number}")
+
+    def copy(self):
+        position = Position.__new__(Position)
+        position.__dict__.update(self.__dict__)
+        position.bitboards = [self.bitboards[0][:], self.bitboards[1][:]]
+        position.occupied_co = self.occupied_co[:]
+        position.squares = self.squares[:]
+        position.attacks = self.attacks[:]
+        position._attacked = self._attacked[:]
+        position.undo_stack = self.undo_stack[:]
+        position.key_stack = self.key_stack[:]
+        position.repetitions = self.repetitions.copy()
+        return position
+
+    def put_piece(self, sq, color, kind):
+        """Place a piece on an empty square.
+
+        Attack sets are not updated; call refresh_attacks() and
+        refresh_key() after setting up a position piece by piece.
+        """
+        bit = BB_SQUARES[sq]
+        self.bitboards[color][kind] |= bit
+        self.occupied_co[color] |= bit
+        self.occupied |= bit
+        self.squares[sq] = code = color << 3 | kind
+        self.key ^= PIECE_KEYS[code][sq]
+        self.mg += MG_SQUARE_VALUES[code][sq]
+        self.eg += EG_SQUARE_VALUES[code][sq]
+        self.phase += PHASE_WEIGHTS[kind]
+
+    def remove_piece(self, sq):
+        """Remove and return (color, piece type) of the piece on sq."""
+        code = self.squares[sq]
+        if code is None:
+            return None
+        color, kind = code >> 3, code & 7
+        bit = BB_SQUARES[sq]
+        self.bitboards[color][kind] ^= bit
+        self.occupied_co[color] ^= bit
+        self.occupied ^= bit
+        self.squares[sq] = None
+        self.key ^= PIECE_KEYS[code][sq]
+        self.mg -= MG_SQUARE_VALUES[code][sq]
+        self.eg -= EG_SQUARE_VALUES[code][sq]
+        self.phase -= PHASE_WEIGHTS[kind]
+        return color, kind
+
+    def piece_at(self, sq):
+        """(color, piece type) of the piece on sq, or None."""
+        code = self.squares[sq]
+        if code is None:
+            return None
+        return code >> 3, code & 7
+
+    def king_square(self, color):
+        return lsb(self.bitboards[color][KING])
+
+    def attacks_from(self, sq):
+        """Squares attacked by the piece standing on sq."""
+        code = self.squares[sq]
+        if code is None:
+            return 0
+        kind = code & 7
+        if kind == PAWN:
+            return PAWN_ATTACKS[code >> 3][sq]
+        if kind == KNIGHT:
+            return KNIGHT_ATTACKS[sq]
+        if kind == KING:
+            return KING_ATTACKS[sq]
+        if kind == BISHOP:
+            return bishop_attacks(sq, self.occupied)
+        if kind == ROOK:
+            return rook_attacks(sq, self.occupied)
+        return queen_attacks(sq, self.occupied)
+
+    def attackers(self, color, sq, occupied=None):
+        """Bitboard of pieces of the given color attacking sq."""
+        if occupied is None:
+            occupied = self.occupied
+        bbs = self.bitboards[color]
+        queens = bbs[QUEEN]
+        return ((KNIGHT_ATTACKS[sq] & bbs[KNIGHT])
+                | (KING_ATTACKS[sq] & bbs[KING])
+                | (PAWN_ATTACKS[color ^ 1][sq] & bbs[PAWN])
+                | (bishop_attacks(sq, occupied) & (bbs[BISHOP] | queens))
+                | (rook_attacks(sq, occupied) & (bbs[ROOK] | queens)))
+
+    def is_attacked(self, sq, by_color):
+        bbs = self.bitboards[by_color]
+        if KNIGHT_ATTACKS[sq] & bbs[KNIGHT] or KING_ATTACKS[sq] & bbs[KING]:
+            return True
+        if PAWN_ATTACKS[by_color ^ 1][sq] & bbs[PAWN]:
+            return True
+        queens = bbs[QUEEN]
+        if bishop_attacks(sq, self.occupied) & (bbs[BISHOP] | queens):
+            return True
+        return bool(rook_attacks(sq, self.occupied) & (bbs[ROOK] | queens))
+
+    def in_check(self, color=None):
+        if color is None:
+            color = self.turn
+        return self.is_attacked(self.king_square(color), color ^ 1)
+
+    def attacked_by(self, color):
+        """Bitboard of every square attacked by the given color."""
+        attacked = self._attacked[color]
+        if attacked is None:
+            attacked = 0
+            attacks = self.attacks
+            for sq in scan(self.occupied_co[color]):
+                attacked |= attacks[sq]
+            self._attacked[color] = attacked
+        return attacked
+
+    def checkers(self):
+        """Bitboard of the pieces giving check to the side to move."""
+        return self.attackers(self.turn ^ 1, self.king_square(self.turn))
+
+    def pinned(self, color):
+        """Bitboard of the pieces of the given color pinned to their king
+        by an enemy slider."""
+
+        king = self.king_square(color)
+        them = self.bitboards[color ^ 1]
+        queens = them[QUEEN]
+        # Sliders that would attack the king if nothing stood in between
+        snipers = ((bishop_attacks(king, 0) & (them[BISHOP] | queens))
+                   | (rook_attacks(king, 0) & (them[ROOK] | queens)))
+
+        pinned = 0
+        for sq in scan(snipers):
+            blockers = BETWEEN[king][sq] & self.occupied
+            if blockers and not blockers & (blockers - 1):
+                pinned |= blockers
+        return pinned & self.occupied_co[color]
+
+    def refresh_attacks(self):
+        """Recompute the attack set of every square from scratch."""
+        self.attacks = [self.attacks_from(sq) for sq in range(64)]
+        self._attacked = [None, None]
+
+    def refresh_key(self):
+        """Recompute the Zobrist key and restart repetition counting."""
+        self.key = compute_key(self)
+        self.key_stack = array("Q")
+        self.repetitions = {self.key: 1}
+
+    def is_repetition(self, count=3):
+        """True if the current position occurred at least 'count' times."""
+        return self.repetitions[self.key] >= count
+
+    def _update_attacks(self, changed):
+        """Bring attack sets up to date after the squares in 'changed'
+        were emptied or filled."""
+
+        attacks = self.attacks
+        for sq in scan(changed):
+            attacks[sq] = self.attacks_from(sq)
+
+        # A slider only sees a change if it happened on one of the squares
+        # it currently attacks (up to and including the first blocker).
+        white, black = self.bitboards
+        sliders = (white[BISHOP] | white[ROOK] | white[QUEEN]
+                   | black[BISHOP] | black[ROOK] | black[QUEEN]) & ~changed
+        for sq in scan(sliders):
+            if attacks[sq] & changed:
+                attacks[sq] = self.attacks_from(sq)
+
+        self._attacked = [None, None]
+
+    def affected(self, changed):
+        """Bitboard of pieces whose move sets may differ after the squares
+        in 'changed' (as returned by make_move) were modified."""
+
+        refreshed = changed
+        attacks = self.attacks
+        for sq in scan(self.occupied & ~changed):
+            if attacks[sq] & changed:
+                refreshed |= BB_SQUARES[sq]
+
+        # Pawn pushes are blocked by squares in front of the pawn, and
+        # castling depends on the whole back rank.
+        white, black = self.bitboards
+        refreshed |= white[PAWN] & ((changed >> 8) | (changed >> 16))
+        refreshed |= black[PAWN] & ((changed << 8) | (changed << 16))
+        refreshed |= white[KING] | black[KING]
+
+        return refreshed & self.occupied
+
+    def make_move(self, move):
+        """Play a pseudo-legal move for the side to move.
+
+        Everything needed to take the move back is packed into a single
+        int on ``undo_stack``:
+
+            bits  0-15  the move
+            bits 16-19  castling rights
+            bits 20-26  en passant square + 1 (0 if none)
+            bits 27-30  captured piece code + 1 (0 if none)
+            bits 31-    halfmove clock
+
+        Pawns need no first-move flag, a pawn on its starting rank can
+        always push twice.
+
+        Returns:
+            int: Bitboard of the squares the move changed, including the
+                en passant squares it cleared or created.
+
+        """
+
+        frm, to, flag = move & 63, (move >> 6) & 63, move >> 12
+        us = self.turn
+        kind = self.squares[frm] & 7
+        changed = BB_SQUARES[frm] | BB_SQUARES[to]
+
+        captured = self.squares[to]
+        self.key_stack.append(self.key)
+        self.undo_stack.append(
+            move | self.castling << 16
+            | (0 if self.ep_square is None else self.ep_square + 1) << 20
+            | (0 if captured is None else captured + 1) << 27
+            | self.halfmove_clock << 31)
+
+        if captured is not None:
+            self.remove_piece(to)
+        self.remove_piece(frm)
+        self.put_piece(to, us, flag - 3 if flag >= PROMO_KNIGHT else kind)
+
+        if flag == EN_PASSANT:
+            victim = to - 8 if us == WHITE else to + 8
+            self.remove_piece(victim)
+            changed |= BB_SQUARES[victim]
+        elif flag == CASTLING:
+            rook_from, rook_to = CASTLING_ROOK[to]
+            self.remove_piece(rook_from)
+            self.put_piece(rook_to, us, ROOK)
+            changed |= BB_SQUARES[rook_from] | BB_SQUARES[rook_to]
+
+        key = self.key ^ CASTLING_KEYS[self.castling] ^ TURN_KEY
+        self.castling &= CASTLING_KEPT[frm] & CASTLING_KEPT[to]
+        key ^= CASTLING_KEYS[self.castling]
+
+        ep_squares = 0
+        if self.ep_square is not None:
+            ep_squares = BB_SQUARES[self.ep_square]
+            key ^= EP_KEYS[self.ep_square & 7]
+        self.ep_square = None
+        if flag == DOUBLE_PUSH:
+            passed = (frm + to) >> 1
+            # Only remember squares an enemy pawn can actually capture to.
+            if PAWN_ATTACKS[us][passed] & self.bitboards[us ^ 1][PAWN]:
+                self.ep_square = passed
+                ep_squares |= BB_SQUARES[passed]
+                key ^= EP_KEYS[passed & 7]
+
+        self.key = key
+        self.repetitions[key] = self.repetitions.get(key, 0) + 1
+
+        if kind == PAWN or captured is not None:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if us == BLACK:
+            self.fullmove_number += 1
+        self.turn = us ^ 1
+
+        self._update_attacks(changed)
+
+        return changed | ep_squares
+
+    def unmake_move(self):
+        """Take back the last move played with make_move.
+
+        Returns:
+            int: Bitboard of the squares that changed, like make_move.
+
+        """
+
+        state = self.undo_stack.pop()
+        frm, to, flag = state & 63, (state >> 6) & 63, (state >> 12) & 15
+
+        repetitions = self.repetitions
+        if repetitions[self.key] == 1:
+            del repetitions[self.key]
+        else:
+            repetitions[self.key] -= 1
+
+        us = self.turn ^ 1
+        self.turn = us
+        if us == BLACK:
+            self.fullmove_number -= 1
+
+        ep_squares = 0
+        if self.ep_square is not None:
+            ep_squares = BB_SQUARES[self.ep_square]
+        ep_square = ((state >> 20) & 127) - 1
+        self.ep_square = None if ep_square < 0 else ep_square
+        if self.ep_square is not None:
+            ep_squares |= BB_SQUARES[self.ep_square]
+
+        self.castling = (state >> 16) & 15
+        self.halfmove_clock = state >> 31
+
+        kind = self.remove_piece(to)[1]
+        self.put_piece(frm, us, PAWN if flag >= PROMO_KNIGHT else kind)
+        changed = BB_SQUARES[frm] | BB_SQUARES[to]
+
+        captured = ((state >> 27) & 15) - 1
+        if captured >= 0:
+            self.put_piece(to, captured >> 3, captured & 7)
+        elif flag == EN_PASSANT:
+            victim = to - 8 if us == WHITE else to + 8
+            self.put_piece(victim, us ^ 1, PAWN)
+            changed |= BB_SQUARES[victim]
+        elif flag == CASTLING:
+            rook_from, rook_to = CASTLING_ROOK[to]
+            self.remove_piece(rook_to)
+            self.put_piece(rook_from, us, ROOK)
+            changed |= BB_SQUARES[rook_from] | BB_SQUARES[rook_to]
+
+        self.key = self.key_stack.pop()
+        self._update_attacks(changed)
+
+        return changed | ep_squares
+
+    def is_legal(self, move):
+        """True if a pseudo-legal move doesn't leave the king in check."""
+        us = self.turn
+        self.make_move(move)
+        legal = not self.in_check(us)
+        self.unmake_move()
+        return legal
+
+    def legal_moves(self):
+        """All legal moves for the side to move.
+
+        An empty list means the game is over: checkmate if the side to
+        move is in check, stalemate otherwise.
+        """
+        return list(self.filter_legal(self.generate_moves()))
+
+    def has_legal_moves(self):
+        return next(self.filter_legal(self.generate_moves()), None) \
+            is not None
+
+    def filter_legal(self, moves):
+        """Yield the legal moves among pseudo-legal ones.
+
+        Uses the checkers and pins of the side to move instead of playing
+        every move: a king may not step onto an attacked square, a pinned
+        piece has to stay on the line through its king, and in check only
+        captures of the checker or blocks are allowed (only king moves in
+        double check). En passant, which removes two pieces from a rank,
+        is the one move still tried on the board.
+        """
+
+        us, them = self.turn, self.turn ^ 1
+        king = self.king_square(us)
+        pinned = self.pinned(us)
+        checkers = self.checkers()
+
+        if not checkers:
+            evasions = FULL
+        elif checkers & (checkers - 1):
+            evasions = 0  # Double check
+        else:
+            evasions = checkers | BETWEEN[king][lsb(checkers)]
+
+        without_king = self.occupied ^ BB_SQUARES[king]
+
+        for move in moves:
+            frm, to = move & 63, (move >> 6) & 63
+            if frm == king:
+                # Castling moves are only generated out of check and
+                # across unattacked squares.
+                if move >> 12 == CASTLING \
+                        or not self.attackers(them, to, without_king):
+                    yield move
+            elif move >> 12 == EN_PASSANT:
+                if self.is_legal(move):
+                    yield move
+            elif evasions >> to & 1:
+                if not pinned >> frm & 1 or LINES[king][frm] >> to & 1:
+                    yield move
+
+    def find_move(self, frm, to, promotion=QUEEN):
+        """The legal move from frm to to (promoting to the given piece), or
+        None if there is no such move."""
+        for move in self.legal_moves():
+            if move & 63 == frm and (move >> 6) & 63 == to:
+                flag = move >> 12
+                if flag >= PROMO_KNIGHT and flag - 3 != promotion:
+                    continue
+                return move
+        return None
+
+    def is_checkmate(self):
+        return self.in_check() and not self.has_legal_moves()
+
+    def is_stalemate(self):
+        return not self.in_check() and not self.has_legal_moves()
+
+    def is_insufficient_material(self):
+        """True if neither side can possibly mate: bare kings, a single
+        minor piece, or only bishops all on squares of one color."""
+        white, black = self.bitboards
+        if white[PAWN] | black[PAWN] | white[ROOK] | black[ROOK] \
+                | white[QUEEN] | black[QUEEN]:
+            return False
+        knights = white[KNIGHT] | black[KNIGHT]
+        bishops = white[BISHOP] | black[BISHOP]
+        if popcount(knights | bishops) <= 1:
+            return True
+        return not knights and (not bishops & LIGHT_SQUARES
+                                or not bishops & ~LIGHT_SQUARES)
+
+    def outcome(self):
+        """Outcome of the game if it is over in this position, else None.
+
+        Fifty-move and threefold repetition draws are claimed
+        automatically.
+        """
+        if not self.has_legal_moves():
+            if self.in_check():
+                return Outcome(CHECKMATE, self.turn ^ 1)
+            return Outcome(STALEMATE, None)
+        if self.is_insufficient_material():
+            return Outcome(INSUFFICIENT_MATERIAL, None)
+        if self.halfmove_clock >= 100:
+            return Outcome(FIFTY_MOVES, None)
+        if self.is_repetition(3):
+            return Outcome(THREEFOLD_REPETITION, None)
+        return None
+
+    def moves_from(self, sq):
+        """Bitboard of pseudo-legal destinations of the piece on sq."""
+
+        code = self.squares[sq]
+        if code is None:
+            return 0
+        color, kind = code >> 3, code & 7
+
+        if kind == PAWN:
+            enemy = self.occupied_co[color ^ 1]
+            if self.ep_square is not None and color == self.turn:
+                enemy |= BB_SQUARES[self.ep_square]
+            targets = self.attacks[sq] & enemy
+            push = sq + 8 if color == WHITE else sq - 8
+            if not self.occupied & BB_SQUARES[push]:
+                targets |= BB_SQUARES[push]
+                start = sq >> 3 == (1 if color == WHITE else 6)
+                double = push + (push - sq)
+                if start and not self.occupied & BB_SQUARES[double]:
+                    targets |= BB_SQUARES[double]
+            return targets
+
+        targets = self.attacks[sq] & ~self.occupied_co[color]
+        if kind == KING and color == self.turn:
+            castles = []
+            self._generate_castling(castles)
+            for move in castles:
+                targets |= BB_SQUARES[(move >> 6) & 63]
+        return targets
+
+    def generate_moves(self, captures_only=False):
+        """Pseudo-legal moves for the side to move (may leave the king in
+        check), as encoded ints.
+
+        With captures_only, only captures and promotions are generated.
+        """
+
+        moves = []
+        append = moves.append
+
+        us = self.turn
+        attacks = self.attacks
+        if captures_only:
+            targets = self.occupied_co[us ^ 1]
+        else:
+            targets = ~self.occupied_co[us] & FULL
+
+        # Every piece except the pawns moves to the squares it attacks.
+        for frm in scan(self.occupied_co[us] & ~self.bitboards[us][PAWN]):
+            for to in scan(attacks[frm] & targets):
+                append(frm | to << 6)
+
+        if not captures_only:
+            self._generate_castling(moves)
+        self._generate_pawn_moves(moves, captures_only)
+
+        return moves
+
+    def _generate_castling(self, moves):
+        if not self.castling:
+            return
+        us, them = self.turn, self.turn ^ 1
+        for color, king_from, king_to, _, _, empty, path, right in CASTLES:
+            if color != us or not self.castling & right:
+                continue
+            if self.occupied & empty:
+                continue
+            if any(self.is_attacked(sq, them) for sq in path):
+                continue
+            moves.append(king_from | king_to << 6 | CASTLING << 12)
+
+    def _generate_pawn_moves(self, moves, captures_only=False):
+        append = moves.append
+
+        us = self.turn
+        pawns = self.bitboards[us][PAWN]
+        if not pawns:
+            return
+        empty = ~self.occupied & FULL
+        enemy = self.occupied_co[us ^ 1]
+
+        if us == WHITE:
+            single = (pawns << 8) & empty
+            double = ((single & BB_RANKS[2]) << 8) & empty
+            left = ((pawns & ~FILE_A) << 7) & enemy
+            right = ((pawns & ~FILE_H) << 9) & enemy
+            push, back_rank = 8, RANK_8
+        else:
+            single = (pawns >> 8) & empty
+            double = ((single & BB_RANKS[5]) >> 8) & empty
+            left = ((pawns & ~FILE_A) >> 9) & enemy
+            right = ((pawns & ~FILE_H) >> 7) & enemy
+            push, back_rank = -8, RANK_1
+
+        if captures_only:
+            single &= back_rank
+            double = 0
+
+        for targets, delta in ((single, push), (left, push - 1),
+                               (right, push + 1)):
+            for to in scan(targets & ~back_rank):
+                append((to - delta) | to << 6)
+            for to in scan(targets & back_rank):
+                frm = to - delta
+                for flag in PROMOTION_FLAGS:
+                    append(frm | to << 6 | flag << 12)
+
+        for to in scan(double):
+            append((to - 2 * push) | to << 6 | DOUBLE_PUSH << 12)
+
+        if self.ep_square is not None:
+            for frm in scan(PAWN_ATTACKS[us ^ 1][self.ep_square] & pawns):
+                append(frm | self.ep_square << 6 | EN_PASSANT << 12)
@@ -0,0 +1,288 @@
+"""Negamax alpha-beta search with iterative deepening."""
+
+from collections import namedtuple
+from time import perf_counter
+
+from .evaluate import evaluate
+from .move import EN_PASSANT, PROMO_KNIGHT
+from .tt import TranspositionTable, EXACT, LOWER, UPPER
+
+MATE = 100000
+INFINITY = 1000000
+MAX_PLY = 64
+
+# Scores beyond this are mates, which are stored in the transposition
+# table relative to the node instead of the root.
+MATE_BOUND = MATE - MAX_PLY
+
+# How often (in nodes) the clock is read: about every 2 ms at the 15-20k
+# nodes per second this engine searches, at no measurable cost.
+CHECK_EVERY = 32
+
+# ponder is the expected reply to move (None if unknown)
+SearchResult = namedtuple(
+    "SearchResult", "move score depth nodes time nps ponder",
+    defaults=(None,))
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def score_to_tt(score, ply):
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+
+class Searcher:
+    """Alpha-beta searcher. The transposition table, killer moves and the
+    history table are kept between searches so that consecutive moves of a
+    game share them."""
+
+    def __init__(self, hash_mb=16):
+
+        self.tt = TranspositionTable(hash_mb)
+
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [[0] * 4096, [0] * 4096]  # [color][from/to bits]
+
+        self.nodes = 0
+        self.deadline = None
+        self.stop_event = None
+
+    def clear(self):
+        """Forget everything learned in earlier searches."""
+        self.tt.clear()
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        self.history = [[0] * 4096, [0] * 4096]
+
+    def new_search(self):
+        """Age the tables at the start of a search of a new position."""
+        self.tt.new_search()
+        for table in self.history:
+            for i in range(4096):
+                table[i] >>= 2
+
+    def search(self, position, time_ms=None, depth=None, stop=None,
+               progress=None):
+        """Search the position until the time budget or the depth runs out.
+
+        Args:
+            position (Position): Position to search, restored on return.
+            time_ms (int): Hard time budget in milliseconds.
+            depth (int): Maximum depth, unlimited if None.
+            stop (threading.Event): Ends the search as if the time had run
+                out once set, e.g. from another thread.
+            progress (callable): Called with the SearchResult of every
+                completed iteration.
+
+        Returns:
+            SearchResult: Best move (None without legal moves), score and
+                statistics of the deepest completed iteration.
+
+        """
+
+        start = perf_counter()
+        self.deadline = None if time_ms is None else start + time_ms / 1000
+        self.stop_event = stop
+        self.nodes = 0
+        max_depth = MAX_PLY - 1 if depth is None else depth
+        self.new_search()
+
+        root_moves = self._legal_root_moves(position)
+        best_move = root_moves[0] if root_moves else None
+        best_score = best_depth = 0
+        best_reply = None
+
+        undo_depth = len(position.undo_stack)
+
+        for cur_depth in range(1, max_depth + 1):
+            if len(root_moves) <= 1:
+                break
+            try:
+                score, move = self._root(position, root_moves, cur_depth)
+            except SearchTimeout:
+                while len(position.undo_stack) > undo_depth:
+                    position.unmake_move()
+                break
+
+            best_move, best_score, best_depth = move, score, cur_depth
+            best_reply = self._reply(position, move)
+
+            # Search the best move first in the next iteration.
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+
+            elapsed = perf_counter() - start
+            if progress is not None:
+                progress(SearchResult(
+                    move, score, cur_depth, self.nodes, elapsed,
+                    int(self.nodes / elapsed) if elapsed else 0, best_reply))
+
+            if abs(score) >= MATE_BOUND:
+                break
+            # The next iteration takes several times as long as all the
+            # previous ones; don't start it if it can't finish anyway.
+            if self.deadline is not None and \
+                    perf_counter() + 2 * elapsed > self.deadline:
+                break
+
+        elapsed = perf_counter() - start
+        nps = int(self.nodes / elapsed) if elapsed else 0
+        return SearchResult(best_move, best_score, best_depth, self.nodes,
+                            elapsed, nps, best_reply)
+
+    def _reply(self, position, move):
+        """Best reply to move according to the transposition table."""
+        position.make_move(move)
+        entry = self.tt.probe(position.key)
+        position.unmake_move()
+        return entry[0] if entry and entry[0] else None
+
+    def _legal_root_moves(self, position):
+        return self._ordered(position, position.legal_moves(), 0)
+
+    def _root(self, position, moves, depth):
+        alpha, beta = -INFINITY, INFINITY
+        best_move = moves[0]
+        for move in moves:
+            position.make_move(move)
+            score = -self._negamax(position, depth - 1, -beta, -alpha, 1)
+            position.unmake_move()
+            if score > alpha:
+                alpha, best_move = score, move
+        self.tt.store(position.key, best_move, alpha, depth, EXACT)
+        return alpha, best_move
+
+    def _tick(self):
+        self.nodes += 1
+        if self.nodes % CHECK_EVERY == 0:
+            if self.deadline is not None and perf_counter() > self.deadline:
+                raise SearchTimeout
+            if self.stop_event is not None and self.stop_event.is_set():
+                raise SearchTimeout
+
+    def _negamax(self, position, depth, alpha, beta, ply):
+
+        if depth <= 0:
+            return self._quiescence(position, alpha, beta, ply)
+
+        self._tick()
+
+        # Fifty-move rule and repetitions (one is enough inside the tree).
+        key = position.key
+        if position.halfmove_clock >= 100 or position.repetitions[key] > 1:
+            return 0
+
+        tt_move = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_move, score, tt_depth, bound = entry
+            if tt_depth >= depth:
+                score = score_from_tt(score, ply)
+                if bound == EXACT or (bound == LOWER and score >= beta) \
+                        or (bound == UPPER and score <= alpha):
+                    return score
+
+        moves = position.legal_moves()
+        if not moves:
+            return -MATE + ply if position.in_check() else 0
+
+        us = position.turn
+        best = -INFINITY
+        best_move = 0
+        alpha_orig = alpha
+
+        for move in self._ordered(position, moves, ply, tt_move):
+            position.make_move(move)
+            score = -self._negamax(
+                position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+
+            if score > best:
+                best, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if position.squares[(move >> 6) & 63] is None:
+                            self._store_cutoff(us, move, depth, ply)
+                        break
+
+        if best >= beta:
+            bound = LOWER
+        elif best > alpha_orig:
+            bound = EXACT
+        else:
+            bound = UPPER
+            best_move = 0
+        self.tt.store(key, best_move, score_to_tt(best, ply), depth, bound)
+
+        return best
+
+    def _quiescence(self, position, alpha, beta, ply):
+
+        self._tick()
+
+        stand_pat = evaluate(position)
+        if stand_pat >= beta or ply >= MAX_PLY - 1:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        moves = list(position.filter_legal(position.generate_moves(True)))
+        for move in self._ordered(position, moves, ply):
+            position.make_move(move)
+            score = -self._quiescence(position, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+
+        return alpha
+
+    def _store_cutoff(self, color, move, depth, ply):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[color][move & 4095] += depth * depth
+
+    def _ordered(self, position, moves, ply, tt_move=0):
+        """Sort moves: the transposition table move, captures and
+        promotions by MVV-LVA, then killer moves, then quiet moves by their
+        history score."""
+
+        squares = position.squares
+        killers = self.killers[ply]
+        history = self.history[position.turn]
+
+        def key(move):
+            if move == tt_move:
+                return 1 << 31
+            victim = squares[(move >> 6) & 63]
+            if victim is not None:
+                return (1 << 30) + 16 * (victim & 7) \
+                    - (squares[move & 63] & 7)
+            if move >> 12 >= PROMO_KNIGHT:
+                return (1 << 30) + (move >> 12)
+            if move >> 12 == EN_PASSANT:
+                return 1 << 30
+            if move == killers[0]:
+                return 1 << 29
+            if move == killers[1]:
+                return (1 << 29) - 1
+            return history[move & 4095]
+
+        moves.sort(key=key, reverse=True)
+        return moves
@@ -0,0 +1,125 @@
+"""Syzygy endgame tablebase probing.
+
+Decoding the Syzygy format is left to the optional python-chess package
+(``pip install chess``), which memory-maps the table files and only
+decompresses the blocks a probe needs. Without it, or without table
+files, nothing here is used and the engine just searches.
+"""
+
+import os
+from collections import OrderedDict
+
+from .bitboard import PAWN, popcount
+from .move import EN_PASSANT
+
+try:
+    import chess
+    import chess.syzygy
+except ImportError:
+    chess = None
+
+
+class Tablebase:
+    """Perfect play for positions with few pieces.
+
+    Args:
+        directory (str): Directory with the .rtbw (WDL) and .rtbz (DTZ)
+            files, several can be separated by os.pathsep.
+        max_pieces (int): Only positions with at most this many pieces
+            (kings included) are probed; defaults to the largest tables
+            found.
+        cache_size (int): Number of probe results kept, least recently
+            used ones are dropped first.
+
+    Raises:
+        ImportError: If python-chess is not installed.
+
+    """
+
+    def __init__(self, directory, max_pieces=None, cache_size=65536):
+
+        if chess is None:
+            raise ImportError("tablebase probing needs python-chess "
+                              "(pip install chess)")
+
+        self.tables = chess.syzygy.Tablebase()
+        for path in directory.split(os.pathsep):
+            self.tables.add_directory(path)
+
+        # Table names look like "KRPvKR"
+        largest = max((len(name) - 1 for name in self.tables.dtz), default=0)
+        self.max_pieces = largest if max_pieces is None \
+            else min(max_pieces, largest)
+
+        self.cache = OrderedDict()  # key -> (wdl, dtz)
+        self.cache_size = cache_size
+
+    def close(self):
+        self.tables.close()
+
+    def covers(self, position):
+        """True if the position is small enough to be in the tables."""
+        return (not position.castling
+                and popcount(position.occupied) <= self.max_pieces)
+
+    def probe(self, position):
+        """WDL (-2 loss ... 2 win, 1/-1 win/loss spoiled by the fifty-move
+        rule) and DTZ of the position, from the side to move's point of
+        view, or None if the tables don't have it."""
+
+        key = position.key
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        board = chess.Board(position.fen())
+        try:
+            result = (self.tables.probe_wdl(board),
+                      self.tables.probe_dtz(board))
+        except KeyError:  # Including MissingTableError
+            result = None
+
+        self.cache[key] = result
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    def best_move(self, position):
+        """The move that wins fastest, or loses slowest, according to the
+        tables.
+
+        Returns:
+            int: Encoded move, None if the position isn't covered.
+
+        """
+
+        if not self.covers(position):
+            return None
+
+        best, best_rank = None, None
+        for move in position.legal_moves():
+            frm, to = move & 63, (move >> 6) & 63
+            # Captures and pawn moves reset the fifty-move counter.
+            zeroing = (position.squares[to] is not None
+                       or position.squares[frm] & 7 == PAWN
+                       or move >> 12 == EN_PASSANT)
+
+            position.make_move(move)
+            try:
+                if not position.has_legal_moves() and position.in_check():
+                    return move
+                result = self.probe(position)
+            finally:
+                position.unmake_move()
+            if result is None:
+                return None
+
+            wdl, dtz = -result[0], abs(result[1])
+            if zeroing:
+                dtz = 0
+            # Win quickly, lose slowly.
+            rank = (wdl, -dtz if wdl > 0 else dtz)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+
+        return best
@@ -0,0 +1,109 @@
+"""Fixed-size transposition table."""
+
+EMPTY, EXACT, LOWER, UPPER = range(4)  # Bound types
+
+ENTRY_BYTES = 16
+BUCKET = 2  # Entries per bucket: depth-preferred and always-replace
+
+SCORE_OFFSET = 1 << 19
+
+MASK64 = (1 << 64) - 1
+
+
+class TranspositionTable:
+    """Hash table of search results, preallocated to a fixed size.
+
+    Every entry is two 64-bit words: the Zobrist key xor'ed with the data
+    word, and the data word itself
+
+        bits  0-15  best move
+        bits 16-35  score + SCORE_OFFSET
+        bits 36-43  depth
+        bits 44-45  bound type
+        bits 46-51  age (search generation)
+
+    so a torn or foreign entry simply fails the key check. Entries live in
+    buckets of two: the first slot keeps the deepest result (replaced by
+    deeper searches or by entries from a newer search), the second one is
+    always overwritten.
+    """
+
+    def __init__(self, size_mb=16):
+
+        self.size_mb = size_mb
+        self.buckets = max(1, (size_mb << 20) // (ENTRY_BYTES * BUCKET))
+        self.table = memoryview(
+            bytearray(self.buckets * BUCKET * ENTRY_BYTES)).cast("Q")
+
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+        self._zeros = None  # Blank table to copy from, made by clear()
+
+    def clear(self):
+        # Keeping the zeros around makes clearing a plain memory copy,
+        # which matters when it is done before every search.
+        if self._zeros is None:
+            self._zeros = memoryview(bytes(len(self.table) * 8)).cast("Q")
+        self.table[:] = self._zeros
+        self.age = 0
+
+    def new_search(self):
+        """Start a new search generation, older entries become stale."""
+        self.age = (self.age + 1) & 63
+        self.probes = self.hits = 0
+
+    def probe(self, key):
+        """Look up a position.
+
+        Returns:
+            tuple: (move, score, depth, bound), or None if not stored.
+
+        """
+
+        self.probes += 1
+        table = self.table
+        index = (key % self.buckets) * (2 * BUCKET)
+        for i in range(index, index + 2 * BUCKET, 2):
+            data = table[i + 1]
+            if table[i] ^ data == key and data:
+                self.hits += 1
+                return (data & 0xFFFF,
+                        ((data >> 16) & 0xFFFFF) - SCORE_OFFSET,
+                        (data >> 36) & 0xFF,
+                        (data >> 44) & 3)
+        return None
+
+    def store(self, key, move, score, depth, bound):
+        table = self.table
+        index = (key % self.buckets) * (2 * BUCKET)
+
+        for slot in range(index, index + 2 * BUCKET, 2):
+            old = table[slot + 1]
+            if table[slot] ^ old == key and old:
+                # Same position: keep the old best move if there is no
+                # new one.
+                if not move:
+                    move = old & 0xFFFF
+                break
+        else:
+            deep = table[index + 1]
+            if depth >= (deep >> 36) & 0xFF or (deep >> 46) & 63 != self.age:
+                slot = index
+            else:
+                slot = index + 2
+
+        data = (move | (score + SCORE_OFFSET) << 16 | min(depth, 255) << 36
+                | bound << 44 | self.age << 46)
+        table[slot] = key ^ data
+        table[slot + 1] = data
+
+    def hashfull(self):
+        """Permille of the first thousand entries used in this search."""
+        used = 0
+        table = self.table
+        for i in range(1, min(2000, len(table)), 2):
+            if table[i] and (table[i] >> 46) & 63 == self.age:
+                used += 1
+        return used * 1000 // min(1000, len(table) // 2)
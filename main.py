@@ -1,10 +1,19 @@
+import argparse
 import pygame
 from sys import exit
 import sys
 from os.path import join
 from pieces import *
 from ai import ChessBot
+import sprites
+from engine import Position
+from engine.bitboard import FULL, COLOR_NAMES, square, coords, scan
+from engine.move import (
+    CASTLING, EN_PASSANT, move_from, move_to, move_flag, promotion)
+from engine.position import CASTLING_ROOK
 from math import sqrt
+from metrics import from_setting
+from time import perf_counter
 
 WS = (1000, 1000)  # Window size (x, y)
 
@@ -22,13 +31,55 @@ BROWN = (139, 69, 19)
 
 DEBUG = False
 
+# Thinking time of the bot per move, in milliseconds
+BOT_TIME = 1000
+
+# Processes the bot searches with
+BOT_WORKERS = 1
+
+# Let the bot think on your time, about the reply it expects
+BOT_PONDER = True
+
+# Polyglot opening book (.bin) of the bot, None to always search
+BOT_BOOK = None
+
+# Directory of Syzygy tablebases for the bot (needs python-chess), None to
+# search endgames too
+BOT_TABLEBASE = None
+
+# Frame rate cap
+FPS = 60
+
+# Speed of move animations, in pixels per millisecond
+ANIMATION_SPEED = 1.0
+
+# Duration of the game over fade (ms) and how dark it gets (0-255)
+FADE_TIME = 1250
+FADE_ALPHA = 175
+
+# Posted by the bot's search thread after every iteration, with the
+# SearchResult as "info"
+BOT_PROGRESS = pygame.USEREVENT
+
 
 class ChessGame:
 
-    def __init__(self):
+    def __init__(self, fps=FPS, event_driven=True, metrics=None):
 
         pygame.init()
 
+        # With event_driven, the main loop sleeps until the next event
+        # whenever nothing is animating or waiting to be drawn.
+        self.fps = fps
+        self.event_driven = event_driven
+        self.clock = pygame.time.Clock()
+
+        # Move being animated: (piece, origin, destination, start time)
+        self.animation = None
+
+        # SearchHandle of the bot while it thinks
+        self.thinking = None
+
         self.board = []
         for column in range(8):  # Two-dimensional list, eight rows and columns
             self.board.append([None] * 8)  # 'None' represents an empty square
@@ -37,8 +88,26 @@ class ChessGame:
 
         self.font = pygame.font.Font('freesansbold.ttf', int(0.060 * WS[0]))
 
-        # "AI" opponent (currently only random movements)
-        self.opp = ChessBot("black")
+        self.background = self._render_background()
+        self.move_marker = self._render_marker((0, 0, 0, 100))
+        self.illegal_marker = self._render_marker((255, 0, 0, 100))
+
+        # Squares to redraw in the next frame (bitboard) and the screen
+        # rect of the piece dragged on the cursor (or animated) in the
+        # last frame.
+        self.dirty = FULL
+        self.cursor = None
+
+        # Engine opponent
+        self.opp = ChessBot("black", workers=BOT_WORKERS, book=BOT_BOOK,
+                            tablebase=BOT_TABLEBASE)
+
+        # Timing counters (see metrics.py), off unless switched on by the
+        # metrics setting or the environment, and the overlay surface
+        # showing them
+        self.metrics = from_setting(metrics)
+        self.overlay = None
+        self.overlay_font = pygame.font.Font('freesansbold.ttf', 16)
 
     @staticmethod
     def check_quit():
@@ -46,235 +115,391 @@ class ChessGame:
             if event.type == pygame.QUIT:
                 sys.exit()
 
-    def draw(self, surface, selection=True):
+    def _render_background(self):
+        """Render the board squares once, to be blitted every frame."""
 
-        # Draw board background
+        background = pygame.Surface(WS)
         for column in range(0, 8):
             for row in range(0, 8):
                 x, y = column * TILESIZE, row * TILESIZE
                 w, h = TILESIZE, TILESIZE
                 if row % 2 == column % 2:
-                    pygame.draw.rect(surface, LIGHTBROWN, (x, y, w, h))
+                    pygame.draw.rect(background, LIGHTBROWN, (x, y, w, h))
                 else:
-                    pygame.draw.rect(surface, BROWN, (x, y, w, h))
+                    pygame.draw.rect(background, BROWN, (x, y, w, h))
+        return background
+
+    @staticmethod
+    def _render_marker(color):
+        marker = pygame.Surface((TILESIZE, TILESIZE), pygame.SRCALPHA)
+        center = (TILESIZE // 2, TILESIZE // 2)
+        radius = TILESIZE // 4
+        pygame.draw.circle(marker, color, center, radius)
+        return marker
+
+    @staticmethod
+    def _square_rect(sq):
+        x, y = coords(sq)
+        return pygame.Rect(x * TILESIZE, y * TILESIZE, TILESIZE, TILESIZE)
+
+    @staticmethod
+    def _covered(rect):
+        """Bitboard of the squares overlapping a screen rect (or None)."""
+
+        squares = 0
+        if rect:
+            for x in range(max(rect.left // TILESIZE, 0),
+                           min((rect.right - 1) // TILESIZE, 7) + 1):
+                for y in range(max(rect.top // TILESIZE, 0),
+                               min((rect.bottom - 1) // TILESIZE, 7) + 1):
+                    squares |= 1 << square(x, y)
+        return squares
+
+    def _marker(self, dest):
+        """Marker to draw on a move of the selected piece, or None."""
+
+        x, y = dest[0], dest[1]
+
+        # Unmarking all friendly pieces
+        if self.board[x][y] and self.board[x][y].color == self.selected.color:
+            return None
+
+        # If the king is selected, moves onto attacked squares (that would
+        # leave it in check) are marked red.
+        if isinstance(self.selected, King):
+            them = 1 - COLOR_NAMES.index(self.selected.color)
+            if self.position.attacked_by(them) >> square(x, y) & 1:
+                return self.illegal_marker
+
+        return self.move_marker
+
+    def _select(self, piece):
+        """Change the selected piece, redrawing the old and new markers."""
+
+        for selected in (self.selected, piece):
+            if selected:
+                self.dirty |= 1 << square(*selected.pos) | selected.moves
+
+        self.selected = piece
+
+    @staticmethod
+    def draw_piece(surface, piece, pos=None):
+        """Draw a piece at a pixel position, or on its square."""
+
+        if pos is None:
+            pos = (piece.pos[0] * TILESIZE, piece.pos[1] * TILESIZE)
+
+        surface.blit(sprites.get(piece.color, piece.kind, TILESIZE), pos)
+
+    def draw(self, surface, selection=True, squares=FULL):
+        """Draw the given squares (a bitboard, all by default) with their
+        markers and pieces, and the selected piece on the mouse cursor."""
+
+        if squares == FULL:
+            surface.blit(self.background, (0, 0))
+        else:
+            for sq in scan(squares):
+                rect = self._square_rect(sq)
+                surface.blit(self.background, rect, rect)
 
         if self.selected and selection:
+            for sq in scan(self.selected.moves & squares):
+                dest = coords(sq)
+                marker = self._marker(dest)
+                if marker:
+                    surface.blit(marker, (dest[0] * TILESIZE,
+                                          dest[1] * TILESIZE))
 
-            # Marker for possible moves.
-            marker = pygame.Surface((TILESIZE, TILESIZE), pygame.SRCALPHA)
-            center = (TILESIZE // 2, TILESIZE // 2)
-            radius = TILESIZE // 4
-
-            for square in self.selected.moves:
-                x, y = square[0], square[1]
-
-                # If the king is selected, illegal moves (that would
-                # leave it in check) are marked.
-                if isinstance(self.selected, King):
-                    if self.selected.color == "white":
-                        if square in self.black_moves:
-                            # Red marker = Illegal move
-                            pygame.draw.circle(
-                                marker, (255, 0, 0, 100), center, radius)
-                        else:
-                            if 0 <= x < 8 and 0 <= y < 8:
-                                if (self.board[x][y]
-                                        and self.board[x][y].color == self.selected.color):
-                                    continue
-                                pygame.draw.circle(
-                                    marker, (0, 0, 0, 100), center, radius)
-                    elif self.selected.color == "black":
-                        if square in self.white_moves:
-                            pygame.draw.circle(
-                                marker, (255, 0, 0, 100), center, radius)
-                        else:
-                            if 0 <= x < 8 and 0 <= y < 8:
-                                if (self.board[x][y]
-                                        and self.board[x][y].color == self.selected.color):
-                                    continue
-                            pygame.draw.circle(
-                                marker, (0, 0, 0, 100), center, radius)
-
-                # The king isn't selected
-                else:
-                    if 0 <= x < 8 and 0 <= y < 8:
-                        # Unmarking all friendly pieces
-                        if (self.board[x][y]
-                                and self.board[x][y].color == self.selected.color):
-                            continue
-                        else:
-                            pygame.draw.circle(
-                                marker, (0, 0, 0, 100), center, radius)
-                    else:
-                        continue
+        animated = self.animation[0] if self.animation else None
 
-                x *= TILESIZE
-                y *= TILESIZE
-                surface.blit(marker, (x, y))
+        # Drawing all other (non-selected) pieces
+        for sq in scan(squares & self.position.occupied):
+            x, y = coords(sq)
+            piece = self.board[x][y]
+            if piece and piece != self.selected and piece != animated:
+                self.draw_piece(surface, piece)
 
-            # Draw selected piece on mouse cursor
+        # Draw selected piece on mouse cursor
+        if self.selected and selection:
             pos = [i - TILESIZE // 2 for i in pygame.mouse.get_pos()]
-            self.selected.draw(surface, TILESIZE, pos)
+            self.draw_piece(surface, self.selected, pos)
 
-        # Drawing all other (non-selected) pieces
-        for column in self.board:
-            for piece in column:
-                if piece:
-                    if piece != self.selected:
-                        piece.draw(surface, TILESIZE)
-
-    def set_board(self):
-
-        # Emptying board
-        for column in self.board:
-            for square in column:
-                square = None
-
-        # Black pieces
-        self.board[0][0] = Rook("black", (0, 0))
-        self.board[1][0] = Knight("black", (1, 0))
-        self.board[2][0] = Bishop("black", (2, 0))
-        self.board[3][0] = Queen("black", (3, 0))
-        self.board[4][0] = King("black", (4, 0))
-        self.board[5][0] = Bishop("black", (5, 0))
-        self.board[6][0] = Knight("black", (6, 0))
-        self.board[7][0] = Rook("black", (7, 0))
-        for column in range(8):
-            self.board[column][1] = Pawn("black", (column, 1))
-
-        # White pieces
-        self.board[0][7] = Rook("white", (0, 7))
-        self.board[1][7] = Knight("white", (1, 7))
-        self.board[2][7] = Bishop("white", (2, 7))
-        self.board[3][7] = Queen("white", (3, 7))
-        self.board[4][7] = King("white", (4, 7))
-        self.board[5][7] = Bishop("white", (5, 7))
-        self.board[6][7] = Knight("white", (6, 7))
-        self.board[7][7] = Rook("white", (7, 7))
-        for column in range(8):
-            self.board[column][6] = Pawn("white", (column, 6))
-
-    def move_selected(self, dest, animate=False):
-        """Move selected piece to destination, if possible."""
+        if animated and self.cursor:
+            self.draw_piece(surface, animated, self.cursor.topleft)
+
+    def render(self):
+        """Redraw what changed since the last frame.
+
+        Returns:
+            list: Screen rects to pass to pygame.display.update, empty if
+                nothing changed.
+
+        """
+
+        # The piece dragged on the cursor or the one being animated
+        cursor = self._animation_rect()
+        if self.selected:
+            cursor = pygame.Rect(
+                [i - TILESIZE // 2 for i in pygame.mouse.get_pos()],
+                (TILESIZE, TILESIZE))
+
+        squares = self.dirty
+        if cursor != self.cursor:
+            squares |= self._covered(self.cursor)
+            self.cursor = cursor
+        if squares:
+            # The dragged piece is blitted whole, so everything under it
+            # is redrawn too.
+            squares |= self._covered(cursor)
+
+        self.dirty = 0
+        if not squares:
+            return []
+
+        self.draw(self.screen, squares=squares)
+        if self.overlay and squares & self._covered(self.overlay.get_rect()):
+            self.screen.blit(self.overlay, (0, 0))
+        return [self._square_rect(sq) for sq in scan(squares)]
+
+    def _report_metrics(self):
+        """Let the metrics report, and show the report if there's an
+        overlay."""
+
+        report = self.metrics.tick()
+        if not report or not self.metrics.overlay:
+            return
+
+        lines = [f"{name}: {stats['count']}x  p50 {stats['p50']:.1f}  "
+                 f"p95 {stats['p95']:.1f}  p99 {stats['p99']:.1f}  "
+                 f"max {stats['max']:.1f} ms"
+                 for name, stats in report["sections"].items()]
+        search = report["search"]
+        if search:
+            hit_rate = search["tt_hit_rate"]
+            lines.append(f"search: depth {search['depth']}  "
+                         f"{search['nodes']} nodes  {search['nps']} nps  "
+                         "tt hits " + ("-" if hit_rate is None
+                                       else f"{hit_rate:.0%}"))
+
+        texts = [self.overlay_font.render(line, True, WHITE)
+                 for line in lines]
+        height = self.overlay_font.get_linesize()
+        overlay = pygame.Surface(
+            (max([text.get_width() for text in texts], default=0) + 10,
+             height * len(texts) + 10), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 160))
+        for i, text in enumerate(texts):
+            overlay.blit(text, (5, 5 + i * height))
+
+        # Redraw under the old overlay and the new one
+        if self.overlay:
+            self.dirty |= self._covered(self.overlay.get_rect())
+        self.overlay = overlay
+        self.dirty |= self._covered(overlay.get_rect())
+
+    def set_board(self, fen=None):
+        """Set up the starting position, or the position of a FEN string.
+
+        Raises:
+            ValueError: If the FEN is malformed.
+
+        """
+
+        # The engine position is the authoritative game state, the
+        # list-of-Piece board is built from it for drawing and input.
+        if fen:
+            self.position = Position.from_fen(fen)
+        else:
+            self.position = Position.initial()
+        self.fen = fen
+        self.board = board_from_position(self.position)
+        self.selected = None
+        self._update_moves()
+        self.dirty = FULL
+
+        # Current turn ("white"/"black")
+        self.cur_turn = COLOR_NAMES[self.position.turn]
+
+    def _update_moves(self, squares=FULL):
+        """Refresh the move lists of the pieces on 'squares'.
+
+        Only called when the position changes; the engine position keeps
+        the attack sets up to date, so this just copies them out.
+        """
+
+        with self.metrics.timer("movegen"):
+            for sq in scan(squares & self.position.occupied):
+                x, y = coords(sq)
+                self.board[x][y].sync_moves(self.position)
+
+    def _push_move(self, orig, dest, move=None):
+        """Play a move on the engine position and mirror it on the board.
+
+        The move is looked up from the squares (promoting to a queen)
+        unless it is given.
+        """
+
+        if move is None:
+            move = self.position.find_move(square(*orig), square(*dest))
+        changed = self.position.make_move(move)
+        self.dirty |= changed
+
+        x, y = dest[0], dest[1]
+        piece = self.board[orig[0]][orig[1]]
+        self.board[orig[0]][orig[1]] = None
+
+        if move_flag(move) == EN_PASSANT:
+            self.board[x][orig[1]] = None
+        elif move_flag(move) == CASTLING:
+            rook_from, rook_to = CASTLING_ROOK[move_to(move)]
+            rook_x, rook_y = coords(rook_from)
+            new_x, new_y = coords(rook_to)
+            rook = self.board[rook_x][rook_y]
+            rook.move((new_x, new_y))
+            self.board[rook_x][rook_y] = None
+            self.board[new_x][new_y] = rook
+
+        if promotion(move) is not None:
+            piece = PIECE_CLASSES[promotion(move)](piece.color, (x, y))
+        else:
+            piece.move((x, y))
+        self.board[x][y] = piece
+
+        self._update_moves(self.position.affected(changed))
+
+    def move_selected(self, dest, animate=False, move=None):
+        """Move selected piece to destination, if possible.
+
+        With animate, the piece slides to its destination over the next
+        frames and the move is played when it arrives. move is the
+        encoded move if it is already known, as for the bot's moves.
+        """
 
         x, y = dest[0], dest[1]
 
         if self._legal_move(dest):
-            prevx = self.selected.pos[0]
-            prevy = self.selected.pos[1]
-            if not animate:
-                self.selected.move((x, y), self.board)
-                self.board[x][y] = self.selected
+            piece = self.selected
+            orig = (piece.pos[0], piece.pos[1])
+            self._select(None)
+
+            if animate:
+                self.animation = (piece, orig, (x, y),
+                                  pygame.time.get_ticks(), move)
+                self.dirty |= 1 << square(*orig)
             else:
-                startx = prevx * TILESIZE
-                starty = prevy * TILESIZE
-                print(startx, starty)
-
-                endx = x * TILESIZE
-                endy = y * TILESIZE
-                dx, dy = endx - startx, endy - starty
-
-                steps = int(sqrt(dx ** 2 + dy ** 2) / 10)
-
-                for i in range(steps):
-                    pygame.time.delay(10)
-                    self.check_quit()
-                    x_ani = startx + int(i / steps * (endx - startx))
-                    y_ani = starty + int(i / steps * (endy - starty))
-                    self.draw(self.screen, False)
-                    self.selected.draw(self.screen, TILESIZE, (x_ani, y_ani))
-                    pygame.display.update()
-
-                self.selected.move((x, y), self.board)
-                self.board[x][y] = self.selected
-
-
-            self.selected = None
-            self.board[prevx][prevy] = None
-            self.cur_turn = {
-            "white": "black", "black": "white"
-            }[self.cur_turn]
-
-
-    def is_checkmate(self):
-        """Check if either king is in checkmate."""
-        white_checkmate = True
-        black_checkmate = True
-
-        for column in self.board:
-            for piece in column:
-                if piece and isinstance(piece, King):
-                    if piece.color == "white":
-                        if piece.pos in self.black_moves:
-                            white_checkmate = True
-                            for move in piece.moves:
-                                if move not in self.black_moves:
-                                    if (self.board[move[0]][move[1]] and
-                                        self.board[move[0]][move[1]].color 
-                                            != piece.color):
-                                        white_checkmate = False
-                                    elif not self.board[move[0]][move[1]]:
-                                        white_checkmate = False
-                            if white_checkmate:
-                                self.loser = "WHITE"
-                                self.game_over = True
-
-        for column in self.board:
-            for piece in column:
-                if piece and isinstance(piece, King):
-                    if piece.color == "black":
-                        if piece.pos in self.white_moves:
-                            black_checkmate = True
-                            for move in piece.moves:
-                                if move not in self.white_moves:
-                                    try:
-                                        if (self.board[move[0]][move[1]] and # TODO: Raises errors
-                                            self.board[move[0]][move[1]].color 
-                                                != piece.color):
-                                            black_checkmate = False
-                                        elif not self.board[move[0]][move[1]]:
-                                            black_checkmate = False
-                                    except IndexError:
-                                        continue
-                            if black_checkmate:
-                                self.loser = "BLACK"
-                                self.game_over = True
+                self._finish_move(orig, (x, y), move)
+
+    def _finish_move(self, orig, dest, move=None):
+
+        self._push_move(orig, dest, move)
+        self.cur_turn = {
+        "white": "black", "black": "white"
+        }[self.cur_turn]
+
+        self.check_game_over()
+        if self.game_over:
+            self.opp.stop_pondering()
+        elif self.cur_turn != self.opp.color and BOT_PONDER:
+            self.opp.ponder(self.position)
+
+    def _animation_progress(self):
+        """Share of the animation done at the current time (1 or more once
+        the piece has arrived)."""
+
+        piece, orig, dest, start, move = self.animation
+        startx, starty = orig[0] * TILESIZE, orig[1] * TILESIZE
+        endx, endy = dest[0] * TILESIZE, dest[1] * TILESIZE
+        duration = sqrt((endx - startx) ** 2 + (endy - starty) ** 2) \
+            / ANIMATION_SPEED
+        return (pygame.time.get_ticks() - start) / duration
+
+    def _finish_animation(self):
+        """Play the animated move once its piece has arrived."""
+
+        if self.animation and self._animation_progress() >= 1:
+            piece, orig, dest, start, move = self.animation
+            self.animation = None
+            self._finish_move(orig, dest, move)
+
+    def _animation_rect(self):
+        """Screen rect of the animated piece at the current time, or None."""
+
+        if not self.animation:
+            return None
+
+        piece, orig, dest, start, move = self.animation
+        startx, starty = orig[0] * TILESIZE, orig[1] * TILESIZE
+        endx, endy = dest[0] * TILESIZE, dest[1] * TILESIZE
+        progress = min(1, self._animation_progress())
+
+        x_ani = startx + int(progress * (endx - startx))
+        y_ani = starty + int(progress * (endy - starty))
+        return pygame.Rect(x_ani, y_ani, TILESIZE, TILESIZE)
+
+    def check_game_over(self):
+        """Check if the game is over (checkmate or a draw)."""
+
+        with self.metrics.timer("game_over_check"):
+            self.outcome = self.position.outcome()
+        if self.outcome:
+            if self.outcome.winner is not None:
+                self.loser = {
+                "white": "BLACK", "black": "WHITE"
+                }[COLOR_NAMES[self.outcome.winner]]
+            self.game_over = True
 
     def game_over_screen(self, surface, loser=None):
 
-        for alpha in range(0, 25):
-            self.check_quit()
-            pygame.time.delay(50)
-            overlay = pygame.Surface(WS, pygame.SRCALPHA)
-            self.draw(overlay)
-            overlay.fill((0, 0, 0, alpha))
-            surface.blit(overlay, (0, 0))
-            pygame.display.update()
-
-        for alpha in range(0, 100):
-            pygame.time.delay(30)
-            text_srfc = pygame.Surface(WS, pygame.SRCALPHA)
-            text = self.font.render(f"{loser} IS IN CHECKMATE!", True, (0, 255, 255))
-            x, y = WS[0] // 8, WS[1] // 2 - 1 / 4 * WS[1]
-            text_srfc.blit(text, (x, y))
-
-            text2 = self.font.render("PRESS [R] TO RESTART", True, (0, 255, 255))
-            x, y = WS[0] // 8, WS[1] // 2
-            text_srfc.blit(text2, (x, y))
-
-            surface.blit(text_srfc, (0, 0))
-            pygame.display.update()
+        self.draw(surface)
+        board = surface.copy()
+
+        shade = pygame.Surface(WS, pygame.SRCALPHA)
+
+        text_srfc = pygame.Surface(WS, pygame.SRCALPHA)
+        if loser:
+            message = f"{loser} IS IN CHECKMATE!"
+        else:
+            message = f"DRAW BY {self.outcome.termination.upper()}"
+        text = self.font.render(message, True, (0, 255, 255))
+        x, y = WS[0] // 8, WS[1] // 2 - 1 / 4 * WS[1]
+        text_srfc.blit(text, (x, y))
+
+        text2 = self.font.render("PRESS [R] TO RESTART", True, (0, 255, 255))
+        x, y = WS[0] // 8, WS[1] // 2
+        text_srfc.blit(text2, (x, y))
+
+        start = pygame.time.get_ticks()
+        fading = True
 
         while True:
-            for event in pygame.event.get():
+            if fading or not self.event_driven:
+                events = pygame.event.get()
+            else:
+                events = [pygame.event.wait()] + pygame.event.get()
+
+            for event in events:
                 if event.type == pygame.QUIT:
                     sys.exit()
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_r:
-                        self.set_board()
-                        self.play()
-                        break
-            pygame.display.update()
+                        self.play(self.fen)
+                        return
+                if event.type == pygame.VIDEOEXPOSE:
+                    pygame.display.update()
+
+            if fading:
+                # Darken the board, then show the text
+                elapsed = pygame.time.get_ticks() - start
+                progress = min(elapsed / FADE_TIME, 1)
+                shade.fill((0, 0, 0, int(progress * FADE_ALPHA)))
+                surface.blit(board, (0, 0))
+                surface.blit(shade, (0, 0))
+                if progress == 1:
+                    surface.blit(text_srfc, (0, 0))
+                    fading = False
+                pygame.display.update()
+
+            self.clock.tick(self.fps)
 
     def _legal_move(self, dest):
         """Check if move to dest with selected piece is legal.
@@ -286,104 +511,76 @@ class ChessGame:
             bool: True if move is legal, False if not.
 
         """
-    
-        x, y = dest[0], dest[1]
 
-        color = self.selected.color
-
-        opp_moves = {
-        "white": self.black_moves, "black": self.white_moves
-        }[color]
+        x, y = dest[0], dest[1]
 
         if not 0 <= x < 8 or not 0 <= y < 8:
             print('invalid index')
             return False
 
-        # Check if move is in selected piece's range
-        if [x, y] in self.selected.moves:
-
-            # Friendly piece on square
-            if self.board[x][y] and self.board[x][y].color == color:
-                return False
-
-            # Square is empty or occupied by opponent piece.
-            else:
-
-                # King is selected => check for enemy moves
-                if isinstance(self.selected, King):
-                    # King would be in check
-                    if [x, y] in opp_moves:
-                        return False
-                return True
-        else:
-            return False
-
-        
-
+        orig = square(*self.selected.pos)
+        return self.position.find_move(orig, square(x, y)) is not None
 
-    def play(self):
+    def play(self, fen=None):
+        """Play a game from the starting position or the given FEN."""
 
-        self.set_board()
+        self.set_board(fen)
 
         pygame.init()
         self.screen = pygame.display.set_mode(WS)
 
-        # Current turn ("white"/"black")
-        self.cur_turn = "white"
-
         self.game_over = False
         self.loser = None
+        self.outcome = None
+        self.thinking = None
+        pygame.display.set_caption("Chess")
+        self.check_game_over()
         # Main loop
         while not self.game_over:
-            
-            self.screen.fill(BLACK)
-
-            # All possible movements of the white and black pieces,
-            # respectively.
-            self.white_moves = []
-            self.black_moves = []
-
-            for column in self.board:
-                for piece in column:
-                    if piece:
-                        piece.update_moves(self.board)
-                        if piece.color == "white":
-                            for square in piece.moves:
-                                self.white_moves.append(square)
-
-                            if isinstance(piece, Pawn):
-                                x, y = piece.pos[0], piece.pos[1]
-                                self.white_moves.append(
-                                    [[x - 1, y - 1], [x + 1, y - 1]])
-                                try:
-                                    self.white_moves.remove([x, y - 2])
-                                except ValueError:
-                                    pass
-                        elif piece.color == "black":
-                            if isinstance(piece, Pawn):
-                                x, y = piece.pos[0], piece.pos[1]
-                                self.black_moves.append([x - 1, y + 1])
-                                self.black_moves.append([x + 1, y + 1])
-                            else:
-                                for square in piece.moves:
-                                    self.black_moves.append(square)
-
-            self.is_checkmate()
+
+            # Sleep until something happens unless a frame is due anyway
+            idle = (self.event_driven and not self.animation
+                    and not self.dirty and self.cur_turn == "white")
+            if idle:
+                events = [pygame.event.wait()] + pygame.event.get()
+            else:
+                events = pygame.event.get()
+            frame_start = perf_counter()
 
             # Event handling
-            for event in pygame.event.get():
+            for event in events:
                 if event.type == pygame.QUIT:
                     sys.exit()
 
+                # The window was uncovered, everything has to be redrawn
+                if event.type == pygame.VIDEOEXPOSE:
+                    self.dirty = FULL
+
                 if event.type == pygame.KEYDOWN:
                     # ESC-key deselects your current piece
                     if event.key == pygame.K_ESCAPE:
-                        self.selected = None
+                        self._select(None)
+                    # F-key prints the position as FEN
+                    if event.key == pygame.K_f:
+                        print(self.position.fen())
+                    # Space makes the bot play its best move so far
+                    if event.key == pygame.K_SPACE and self.thinking:
+                        self.thinking.stop()
                     if event.key == pygame.K_END and DEBUG:
                         self.game_over = True
 
-                # Pressed mousebutton
-                if event.type == pygame.MOUSEBUTTONDOWN:
+                if event.type == BOT_PROGRESS:
+                    info = event.info
+                    pygame.display.set_caption(
+                        f"Chess - thinking: depth {info.depth}, "
+                        f"score {info.score}, {info.nps} nps")
+
+                # Pressed mousebutton, ignored on the bot's turn (while
+                # it thinks and while its move is animated) and while a
+                # move slides into place
+                if event.type == pygame.MOUSEBUTTONDOWN \
+                        and not self.animation \
+                        and self.cur_turn != self.opp.color:
                     # The (x, y)-coordinates for the square you pressed:
                     x, y = [i // TILESIZE for i in pygame.mouse.get_pos()]
 
@@ -391,48 +588,71 @@ class ChessGame:
                         if self.board[x][y]:
                             if self.board[x][y].color == self.cur_turn or DEBUG:
                                 # Selects piece on clicked square
-                                self.selected = self.board[x][y]
+                                self._select(self.board[x][y])
                     else:
                         # If you pressed the original position of your
                         # selected piece it will deselect it
-                        if [x, y] == self.selected.pos:
-                            self.selected = None
-
-                        # Square is a valid move
-                        elif [x, y] in self.selected.moves:
-
-                            # King is selected
-                            if isinstance(self.selected, King):
-                                if self.selected.color == "white":
-                                    if [x, y] not in self.black_moves:
-                                        self.move_selected((x, y))
-                                elif self.selected.color == "black":
-                                    if [x, y] not in self.white_moves:
-                                        self.move_selected((x, y))
-                            else:
-                                self.move_selected((x, y))
+                        if (x, y) == self.selected.pos:
+                            self._select(None)
 
-            if self.cur_turn == "black":
-                while True:
-                    opp_move = self.opp.random_move(self.board)
-                    xpos, ypos = opp_move[0]
-                    x, y = opp_move[1]
-                    self.selected = self.board[xpos][ypos]
-
-                    if self._legal_move((x, y)):
-                        
-                        self.move_selected((x, y), True)
-                        break
-
-
-
-            self.draw(self.screen)
-
-            pygame.display.update()
+                        # Moves there if it is a legal move
+                        else:
+                            self.move_selected((x, y))
+
+            if self.cur_turn == "black" and not self.animation:
+                if self.thinking is None:
+                    # The bot searches on a thread, the window keeps
+                    # running meanwhile.
+                    self.thinking = self.opp.start_search(
+                        self.position, BOT_TIME,
+                        progress=lambda info: pygame.event.post(
+                            pygame.event.Event(BOT_PROGRESS, info=info)))
+                    self.thinking_start = perf_counter()
+                elif self.thinking.done():
+                    # The search only returns legal moves, and the game is
+                    # over (checkmate or stalemate) before a side without
+                    # any.
+                    opp_move = self.thinking.result()
+                    self.thinking = None
+                    self.metrics.add(
+                        "bot_move", (perf_counter() - self.thinking_start)
+                        * 1000)
+                    if self.opp.last_search:
+                        self.metrics.record_search(
+                            self.opp.last_search,
+                            getattr(self.opp.searcher, "tt", None))
+                    pygame.display.set_caption("Chess")
+                    xpos, ypos = coords(move_from(opp_move))
+                    self._select(self.board[xpos][ypos])
+                    self.move_selected(coords(move_to(opp_move)), True,
+                                       opp_move)
+
+            # Play an animated move that has arrived before drawing, so
+            # that the render time is only drawing.
+            self._finish_animation()
+
+            # Only the parts of the screen that changed are redrawn
+            with self.metrics.timer("render"):
+                dirty_rects = self.render()
+            if dirty_rects:
+                pygame.display.update(dirty_rects)
+
+            self.metrics.add("frame", (perf_counter() - frame_start) * 1000)
+            self._report_metrics()
+
+            self.clock.tick(self.fps)
 
         self.game_over_screen(self.screen, self.loser)
 
 
 if __name__ == "__main__":
-    a = ChessGame()
-    a.play()
+    parser = argparse.ArgumentParser(description="Play chess against the bot.")
+    parser.add_argument("fen", nargs="*",
+                        help="position to start from (default: the start)")
+    parser.add_argument("--metrics", default=None,
+                        help='"overlay" and/or JSON lines files to report '
+                             'timings to (default: $CHESS_METRICS)')
+    args = parser.parse_args()
+
+    a = ChessGame(metrics=args.metrics)
+    a.play(" ".join(args.fen) or None)
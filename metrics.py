@@ -0,0 +1,184 @@
+"""Timing counters for the game window and the bot's searches.
+
+Off by default. The CHESS_METRICS environment variable or the --metrics
+option of main.py switch them on and say where the numbers go, "overlay"
+for the top left corner of the window, anything else for a JSON lines
+file (several separated by commas):
+
+    CHESS_METRICS=overlay python main.py
+    python main.py --metrics metrics.jsonl
+
+A report is made every REPORT_INTERVAL seconds while the window runs.
+For every timed section (frame, render, movegen, game_over_check,
+bot_move) it has the count, mean, percentiles and maximum in
+milliseconds since the previous report, plus the statistics of the bot's
+last search: depth, nodes, nps and transposition table hit rate.
+"""
+
+import json
+import os
+from contextlib import nullcontext
+from time import perf_counter, time
+
+ENV_VAR = "CHESS_METRICS"
+
+# Seconds between reports
+REPORT_INTERVAL = 1.0
+
+PERCENTILES = (50, 95, 99)
+
+
+def summarize(times):
+    """Count, mean, percentiles and maximum of some durations."""
+
+    times = sorted(times)
+    summary = {"count": len(times),
+               "mean": round(sum(times) / len(times), 3)}
+    for percentile in PERCENTILES:
+        index = min(len(times) - 1, len(times) * percentile // 100)
+        summary[f"p{percentile}"] = round(times[index], 3)
+    summary["max"] = round(times[-1], 3)
+    return summary
+
+
+class _Timer:
+    """Context manager adding the time spent inside it to a list."""
+
+    __slots__ = ("times", "start")
+
+    def __init__(self, times):
+        self.times = times
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.times.append((perf_counter() - self.start) * 1000)
+
+
+class Metrics:
+    """Collects durations and search statistics and reports them.
+
+    Args:
+        overlay (bool): Keep the last report for the window to show.
+        paths (list): JSON lines files the reports are appended to.
+        interval (float): Seconds between reports.
+
+    """
+
+    def __init__(self, overlay=False, paths=(), interval=REPORT_INTERVAL):
+
+        self.overlay = overlay
+        self.files = [open(path, "a") for path in paths]
+        self.interval = interval
+
+        # Durations in ms since the last report, by section
+        self.samples = {}
+        # Statistics of the bot's last search
+        self.search = None
+
+        self.last_report = perf_counter()
+        # The last report, None before the first one
+        self.report = None
+
+    def timer(self, name):
+        """Time a section: ``with metrics.timer("render"): ...``"""
+        return _Timer(self.samples.setdefault(name, []))
+
+    def add(self, name, ms):
+        """Record a duration measured elsewhere."""
+        self.samples.setdefault(name, []).append(ms)
+
+    def record_search(self, result, tt=None):
+        """Keep the statistics of a finished search.
+
+        Args:
+            result (SearchResult): The search's result.
+            tt (TranspositionTable): Its table, for the hit rate (counted
+                from the start of the search); None if it is not at hand,
+                as for a parallel search.
+
+        """
+
+        hit_rate = None
+        if tt is not None and tt.probes:
+            hit_rate = round(tt.hits / tt.probes, 3)
+        self.search = {"depth": result.depth, "nodes": result.nodes,
+                       "nps": result.nps,
+                       "time_ms": round(result.time * 1000, 1),
+                       "tt_hit_rate": hit_rate}
+
+    def tick(self):
+        """Make a report if the interval has passed.
+
+        Returns:
+            dict: The new report, None if it isn't time yet.
+
+        """
+
+        now = perf_counter()
+        if now - self.last_report < self.interval:
+            return None
+        self.last_report = now
+
+        self.report = {
+            "time": round(time(), 3),
+            "sections": {name: summarize(times)
+                         for name, times in self.samples.items() if times},
+            "search": self.search,
+        }
+        for times in self.samples.values():
+            times.clear()
+
+        for file in self.files:
+            file.write(json.dumps(self.report) + "\n")
+            file.flush()
+        return self.report
+
+    def close(self):
+        for file in self.files:
+            file.close()
+        self.files = []
+
+
+class NullMetrics:
+    """Stands in for Metrics while they are off, doing nothing."""
+
+    overlay = False
+    report = None
+
+    _timer = nullcontext()
+
+    def timer(self, name):
+        return self._timer
+
+    def add(self, name, ms):
+        pass
+
+    def record_search(self, result, tt=None):
+        pass
+
+    def tick(self):
+        return None
+
+    def close(self):
+        pass
+
+
+def from_setting(setting=None):
+    """Metrics as configured by a setting like the environment variable's
+    value, which is read if setting is None.
+
+    Returns:
+        Metrics: NullMetrics if the setting is empty, "0" or "off".
+
+    """
+
+    if setting is None:
+        setting = os.environ.get(ENV_VAR, "")
+    parts = [part.strip() for part in setting.split(",") if part.strip()]
+    if not parts or parts == ["0"] or parts == ["off"]:
+        return NullMetrics()
+    return Metrics(overlay="overlay" in parts,
+                   paths=[part for part in parts if part != "overlay"])
@@ -1,287 +1,88 @@
-import pygame
+from engine.bitboard import (
+    PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, COLOR_NAMES, square,
+    coords)
 
 
 class Piece:
+    """A piece on the GUI board.
 
-    def __init__(self, color: str, pos: tuple):
-
-        self.color = color
-
-        self.pos = [pos[0], pos[1]]  # Makes sure that pos is list
-
-    def move(self, dest, board=None):
-        """Move the piece to coordinates (x, y) specified in 'dest'."""
-
-        self.pos[0], self.pos[1] = dest[0], dest[1]
-
-        self.update_moves(board)
-
-    def draw(self, surface, size, *pos):
-        """Draw the piece to chosen pygame-surface."""
-
-        if not pos:
-            pos = (self.pos[0] * size, self.pos[1] * size)
-
-        self.sprite = pygame.transform.scale(self.sprite, (size, size))
-        self.sprite = pygame.transform.scale(self.sprite, (size, size))
-        surface.blit(self.sprite, pos)
-
-
-class Bishop(Piece):
-
-    def __init__(self, color, pos):
-        super().__init__(color, pos)
-
-        self.sprite = pygame.image.load(color + "Bishop.png")
-
-        self.update_moves()
-
-    def update_moves(self, board=None):
-
-        self.moves = []
-
-        x, y = self.pos[0], self.pos[1]
-
-        for i in [x for x in range(-7, 8) if x != 0]:
-            self.moves.append([x + i, y + i])
-            self.moves.append([x + i, y - i])
-
-        if board:
-            self.remove_diag_blocks(board)
-
-    def remove_diag_blocks(self, board):
-
-        x, y = self.pos[0], self.pos[1]
-
-        for i in [a for  a in range(1, 8) if x + a < 8 and y + a < 8]:
-            if board[x + i][y + i]:
-                for j in range(i + 1, 8):
-                    if x + i > 7 or y + i > 7:
-                        break
-                    try:
-                        self.moves.remove([x + j, y + j])
-                    except ValueError:
-                        continue
-
-        for i in [a for  a in range(1, 8) if x + a < 8 and y - a >= 0]:
-            if board[x + i][y - i]:
-                for j in range(i + 1, 8):
-                    if x + i > 7 or y - i >= 7:
-                        break
-                    try:
-                        self.moves.remove([x + j, y - j])
-                    except ValueError:
-                        continue
-
-        for i in [a for a in range(1, 8) if x - a >= 0 and y + a < 8]:
-            if board[x - i][y + i]:
-                for j in range(i + 1, 8):
-                    if x - j < 0 or y + j > 7:
-                        break
-                    try:
-                        self.moves.remove([x - j, y + j])
-                    except ValueError:
-                        continue
-
-        for i in [a for a in range(1, 8) if x - a >= 0 and y - a >= 0]:
-            if board[x - i][y - i]:
-                for j in range(i + 1, 8):
-                    if x - i < 0 or y - i < 0:
-                        break
-                    try:
-                        self.moves.remove([x - j, y - j])
-                    except ValueError:
-                        continue
-
-
-class Rook(Piece):
-
-    def __init__(self, color, pos):
-        super().__init__(color, pos)
-
-        self.sprite = pygame.image.load(color + "Rook.png")
+    Only what the window needs: where the piece stands and where it can
+    go. The moves come from the engine position (sync_moves), the sprite
+    from the sprites module, so a piece is a few slots and no __dict__.
+    """
 
-        self.update_moves()
+    __slots__ = ("color", "pos", "moves")
 
-    def update_moves(self, board=None):
+    kind = None  # Engine piece type, set by every subclass
 
-        self.moves = []
-
-        x, y = self.pos[0], self.pos[1]
-
-        for i in [x for x in range(-8, 8) if x != 0]:
-            self.moves.append([x + i, y])
-            self.moves.append([x, y + i])
+    def __init__(self, color: str, pos: tuple):
 
-        if board:
-            self.remove_straight_blocks(board)
+        self.color = color
 
-    def remove_straight_blocks(self, board):
+        self.pos = (pos[0], pos[1])
 
-        x, y = self.pos[0], self.pos[1]
+        # Bitboard of the squares the piece can move to (pseudo-legal,
+        # moves into check are marked as illegal when drawn)
+        self.moves = 0
 
-        for i in range(1, 8 - x):
-            if board[x + i][y]:
-                for j in range(i + 1, 8 - x):
-                    try:
-                        self.moves.remove([x + j, y])
-                    except ValueError:
-                        continue
+    def sync_moves(self, position):
+        """Read the piece's moves from an engine Position."""
 
-        for i in range(1, x + 1):
-            if board[x - i][y]:
-                for j in range(i + 1, x + 1):
-                    try:
-                        self.moves.remove([x - j, y])
-                    except ValueError:
-                        continue
+        self.moves = position.moves_from(square(*self.pos))
 
-        for i in range(1, 8 - y):
-            if board[x][y + i]:
-                for j in range(i + 1, 8 - y):
-                    try:
-                        self.moves.remove([x, y + j])
-                    except ValueError:
-                        continue
+    def move(self, dest):
+        """Move the piece to coordinates (x, y) specified in 'dest'."""
 
-        for i in range(1, y + 1):
-            if board[x][y - i]:
-                for j in range(i + 1, y + 1):
-                    try:
-                        self.moves.remove([x, y - j])
-                    except ValueError:
-                        continue
+        self.pos = (dest[0], dest[1])
 
 
 class Pawn(Piece):
-
-    def __init__(self, color, pos):
-        super().__init__(color, pos)
-
-        self.sprite = pygame.image.load(color + "Pawn.png")
-
-        self.first_move = True
-
-        self.update_moves()
-
-    def update_moves(self, board=None):
-
-        self.moves = []
-
-        dy = {"white": -1, "black": 1}[self.color]
-        self.moves.append([self.pos[0], self.pos[1] + dy])
-        if self.first_move:
-            self.moves.append([self.pos[0], self.pos[1] + 2 * dy])
-
-        if board:
-            for square in self.moves:
-                x, y = square[0], square[1]
-                try:
-                    if board[x][y]:
-                        self.moves.remove(square)
-                except IndexError:
-                    continue
-
-            x, y = self.pos[0], self.pos[1]
-            for dx in [-1, 1]:
-                try:
-                    if board[x + dx][y + dy]:
-                        if board[x + dx][y + dy].color != self.color:
-                            self.moves.append([x + dx, y + dy])
-                except IndexError:
-                    continue
-
-
-
-    def move(self, dest, board=None):
-        super().move(dest)
-
-        self.first_move = False
-
-
-class Queen(Rook, Bishop):
-
-    def __init__(self, color, pos):
-
-        super().__init__(color, pos)
-
-        self.sprite = pygame.image.load(color + "Queen.png")
-
-        self.update_moves()
-
-    def update_moves(self, board=None):
-
-        x, y = self.pos[0], self.pos[1]
-
-        self.moves = []
-
-        for i in [x for x in range(-7, 8) if x != 0]:
-            self.moves.append([x + i, y + i])
-            self.moves.append([x + i, y - i])
-            self.moves.append([x + i, y])
-            self.moves.append([x, y + i])
-
-        if board:
-            self.remove_diag_blocks(board)
-            self.remove_straight_blocks(board)
+    __slots__ = ()
+    kind = PAWN
 
 
 class Knight(Piece):
+    __slots__ = ()
+    kind = KNIGHT
 
-    def __init__(self, color, pos):
-        super().__init__(color, pos)
 
-        self.sprite = pygame.image.load(color + "Knight.png")
+class Bishop(Piece):
+    __slots__ = ()
+    kind = BISHOP
 
-        self.update_moves()
 
-    def update_moves(self, board=None):
+class Rook(Piece):
+    __slots__ = ()
+    kind = ROOK
 
-        x, y = self.pos[0], self.pos[1]
 
-        self.moves = [[x - 1, y - 2], [x + 1, y - 2], [x + 2, y - 1],
-                      [x + 2, y + 1], [x + 1, y + 2], [x - 1, y + 2],
-                      [x - 2, y + 1], [x - 2, y - 1]]
+class Queen(Piece):
+    __slots__ = ()
+    kind = QUEEN
 
-        # Removing moves which end on friendly piece.
-        # if board:
-        #     for move in temp_moves:
-        #         if 0 <= move[0] < 8 and 0 <= move[1] < 8:
-        #             if not board[move[0]][move[1]]:
-        #                 self.moves.append(move)
-        #             elif board[move[0]][move[1]].color != self.color:
-        #                 self.moves.append(move)
 
 class King(Piece):
+    __slots__ = ()
+    kind = KING
 
-    def __init__(self, color, pos):
-        super().__init__(color, pos)
-
-        self.sprite = pygame.image.load(color + "King.png")
-
-        self.update_moves()
 
-    def update_moves(self, board=None):
+PIECE_CLASSES = {PAWN: Pawn, KNIGHT: Knight, BISHOP: Bishop,
+                 ROOK: Rook, QUEEN: Queen, KING: King}
 
-        x, y = self.pos[0], self.pos[1]
 
-        # Temporary list of moves, will be filtered below.
-        self.moves = [[x - 1, y - 1], [x, y - 1], [x + 1, y - 1], [x + 1, y],
-                      [x + 1, y + 1], [x, y + 1], [x - 1, y + 1], [x - 1, y]]
+def board_from_position(position):
+    """Build the GUI's 8x8 list-of-Piece board from an engine Position.
 
-        # # Removing moves which end on friendly piece or outside the board.
-        # if board:
-        #     for move in temp_moves:
-        #         if 0 <= move[0] < 8 and 0 <= move[1] < 8:
-        #             if not board[move[0]][move[1]]:
-        #                 self.moves.append(move)
-        #             elif board[move[0]][move[1]].color != self.color:
-        #                 self.moves.append(move)
+    The pieces' moves are left empty, see Piece.sync_moves().
+    """
 
-if __name__ == "__main__":
-    # For testing purposes
+    board = [[None] * 8 for _ in range(8)]
 
-    test = Piece("white", (0, 0))
+    for sq in range(64):
+        piece = position.piece_at(sq)
+        if piece:
+            color, kind = piece
+            x, y = coords(sq)
+            board[x][y] = PIECE_CLASSES[kind](COLOR_NAMES[color], (x, y))
 
-    screen = pygame.display.set_mode((500, 500))
-    test.draw(screen, 50)
+    return board
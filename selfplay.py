@@ -0,0 +1,192 @@
+"""Headless bot-vs-bot games on a process pool.
+
+Plays a batch of games between two engines without opening a window and
+streams every finished game to disk: the game itself to a PGN file and
+the result with the time spent on every move to a JSON lines file.
+
+    python selfplay.py --games 1000 --workers 8 --white-time 100 \\
+        --black-time 50 --pgn games.pgn --results results.jsonl
+"""
+
+import argparse
+import json
+import multiprocessing
+from array import array
+from datetime import date
+from random import Random
+from time import perf_counter
+
+from ai import ChessBot
+from engine import Position
+from engine.bitboard import WHITE, COLOR_NAMES
+from engine.pgn import game_to_pgn
+
+# Engines of the current worker process by color, see _bot()
+_bots = {}
+
+
+def engine_name(args, color):
+    name = COLOR_NAMES[color]
+    if getattr(args, f"{name}_engine") == "random":
+        return "Random"
+    time_ms = getattr(args, f"{name}_time")
+    depth = getattr(args, f"{name}_depth")
+    limits = []
+    if time_ms is not None:
+        limits.append(f"{time_ms}ms")
+    if depth is not None:
+        limits.append(f"depth {depth}")
+    return f"ChessBot ({', '.join(limits)})"
+
+
+def _bot(args, color):
+    if color not in _bots:
+        _bots[color] = ChessBot(COLOR_NAMES[color], args.hash, verbose=False,
+                                book=args.book, tablebase=args.tablebase,
+                                weights=args.weights)
+    return _bots[color]
+
+
+def play_game(task):
+    """Play one game (in a worker process).
+
+    Args:
+        task (tuple): Game number and the parsed command line arguments.
+
+    Returns:
+        tuple: (game number, PGN text, result record)
+
+    """
+
+    number, args = task
+    rng = Random(args.seed * 1000003 + number)
+
+    for color in (WHITE, WHITE ^ 1):
+        # Every game starts from empty tables, like a fresh engine.
+        _bot(args, color).searcher.clear()
+
+    position = Position.initial()
+    moves, times = array("H"), []
+    outcome = None
+    while len(moves) < args.max_plies:
+        name = COLOR_NAMES[position.turn]
+        start = perf_counter()
+        if len(moves) < args.random_plies \
+                or getattr(args, f"{name}_engine") == "random":
+            move = rng.choice(position.legal_moves())
+        else:
+            move = _bot(args, position.turn).search(
+                position, getattr(args, f"{name}_time"),
+                getattr(args, f"{name}_depth"))
+        times.append(round((perf_counter() - start) * 1000, 1))
+
+        position.make_move(move)
+        moves.append(move)
+        outcome = position.outcome()
+        if outcome:
+            break
+
+    if outcome:
+        result, termination = outcome.result(), outcome.termination
+    else:
+        result, termination = "1/2-1/2", "move limit"
+
+    headers = {
+        "Event": "Self-play",
+        "Date": date.today().strftime("%Y.%m.%d"),
+        "Round": number,
+        "White": engine_name(args, WHITE),
+        "Black": engine_name(args, WHITE ^ 1),
+        "Termination": termination,
+        "PlyCount": len(moves),
+    }
+    pgn = game_to_pgn(Position.initial(), moves, headers, result)
+
+    record = {
+        "game": number,
+        "white": headers["White"],
+        "black": headers["Black"],
+        "result": result,
+        "termination": termination,
+        "plies": len(moves),
+        "white_ms": times[0::2],
+        "black_ms": times[1::2],
+    }
+    return number, pgn, record
+
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int,
+                        default=multiprocessing.cpu_count())
+    for name in COLOR_NAMES:
+        parser.add_argument(f"--{name}-engine", default="search",
+                            choices=("search", "random"))
+        parser.add_argument(f"--{name}-time", type=int, default=None,
+                            help="milliseconds per move")
+        parser.add_argument(f"--{name}-depth", type=int, default=None,
+                            help="depth limit per move")
+    parser.add_argument("--hash", type=int, default=16,
+                        help="transposition table size per engine in MB")
+    parser.add_argument("--book", default=None,
+                        help="Polyglot opening book of the search engines")
+    parser.add_argument("--tablebase", default=None,
+                        help="Syzygy tablebase directory "
+                             "(needs python-chess)")
+    parser.add_argument("--weights", default=None,
+                        help="evaluation weights file of the search engines "
+                             "(default: weights.json if there is one)")
+    parser.add_argument("--random-plies", type=int, default=4,
+                        help="random opening moves, so games differ")
+    parser.add_argument("--max-plies", type=int, default=400,
+                        help="adjudicate a draw after this many moves")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pgn", default="selfplay.pgn")
+    parser.add_argument("--results", default="selfplay.jsonl")
+    args = parser.parse_args(argv)
+
+    # Without any limit a search would never end.
+    for name in COLOR_NAMES:
+        if getattr(args, f"{name}_time") is None \
+                and getattr(args, f"{name}_depth") is None:
+            setattr(args, f"{name}_time", 100)
+
+    return args
+
+
+def main(argv=None):
+
+    args = parse_args(argv)
+
+    scores = {"1-0": 0, "0-1": 0, "1/2-1/2": 0}
+    move_times = {"white_ms": [], "black_ms": []}
+
+    tasks = [(number, args) for number in range(1, args.games + 1)]
+    with multiprocessing.Pool(args.workers) as pool, \
+            open(args.pgn, "w") as pgn_file, \
+            open(args.results, "w") as results_file:
+
+        for number, pgn, record in pool.imap_unordered(play_game, tasks):
+            pgn_file.write(pgn)
+            pgn_file.flush()
+            results_file.write(json.dumps(record) + "\n")
+            results_file.flush()
+
+            scores[record["result"]] += 1
+            for key in move_times:
+                move_times[key] += record[key]
+            print(f"Game {number}: {record['result']} "
+                  f"({record['termination']}, {record['plies']} plies)")
+
+    print(f"White wins: {scores['1-0']}, black wins: {scores['0-1']}, "
+          f"draws: {scores['1/2-1/2']}")
+    for key, times in move_times.items():
+        if times:
+            print(f"{key.split('_')[0].capitalize()} time per move: "
+                  f"{sum(times) / len(times):.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Piece sprites, loaded from disk once and cached per tile size."""
+
+import pygame
+
+from engine.bitboard import PIECE_NAMES
+
+# Sprites as loaded from disk, keyed by (color, piece type)
+_images = {}
+
+# Scaled sprites, keyed by (color, piece type, tile size)
+_scaled = {}
+
+
+def load(color, kind):
+    """Return the unscaled sprite of a piece, loading it on first use."""
+
+    key = (color, kind)
+    if key not in _images:
+        _images[key] = pygame.image.load(color + PIECE_NAMES[kind] + ".png")
+    return _images[key]
+
+
+def get(color, kind, size):
+    """Return the sprite of a piece scaled to size x size pixels."""
+
+    key = (color, kind, size)
+    sprite = _scaled.get(key)
+    if sprite is None:
+        sprite = pygame.transform.scale(load(color, kind), (size, size))
+        _scaled[key] = sprite = sprite.convert_alpha()
+    return sprite
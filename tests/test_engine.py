@@ -0,0 +1,119 @@
+"""Move generation and notation checks, run with ``python -m pytest``."""
+
+import io
+from random import Random
+
+import pytest
+
+from engine import perft
+from engine.notation import move_to_san, parse_san
+from engine.pgn import game_to_pgn, read_games
+from engine.position import Position, START_FEN
+
+FENS = [fen for _, fen, _ in perft.REFERENCE_POSITIONS]
+
+
+def random_game(fen=START_FEN, plies=80, seed=0):
+    """Moves of a random game from a position, shorter if it ends."""
+
+    rng = Random(seed)
+    position = Position.from_fen(fen)
+    moves = []
+    for _ in range(plies):
+        legal = position.legal_moves()
+        if not legal:
+            break
+        moves.append(rng.choice(legal))
+        position.make_move(moves[-1])
+    return moves
+
+
+def test_perft():
+    assert perft.check(max_nodes=10000, out=lambda line: None)
+
+
+def test_fen_round_trip():
+    for fen in FENS:
+        assert Position.from_fen(fen).fen() == fen
+
+
+def test_fen_round_trip_after_moves():
+    for seed, fen in enumerate(FENS):
+        position = Position.from_fen(fen)
+        for move in random_game(fen, 40, seed):
+            position.make_move(move)
+            copy = Position.from_fen(position.fen())
+            assert copy.fen() == position.fen()
+            assert copy.key == position.key
+
+
+def test_fen_drops_castling_rights_without_king_or_rook():
+    for fen in ("4k3/8/8/8/8/8/8/4K3 w KQ - 0 1",
+                "4k3/8/8/8/8/8/8/R6K w Q - 0 1"):
+        position = Position.from_fen(fen)
+        assert position.castling == 0
+        assert position.fen().split()[2] == "-"
+
+
+def test_fen_rejects_bad_en_passant_square():
+    for square in ("e9", "e0", "i3", "e33"):
+        with pytest.raises(ValueError):
+            Position.from_fen(f"k7/8/8/8/8/8/8/K7 w - {square} 0 1")
+
+
+def test_fen_needs_one_king_per_side():
+    for fen in ("8/8/8/8/8/8/8/8 w - - 0 1",
+                "8/8/8/8/8/8/8/K7 w - - 0 1",
+                "kk6/8/8/8/8/8/8/K7 w - - 0 1"):
+        with pytest.raises(ValueError):
+            Position.from_fen(fen)
+
+
+def test_pgn_bad_fen_tag():
+    text = ('[FEN "k7/8/8/8/8/8/8/K7 w - e9 0 1"]\n\n1. Kb1 *\n\n'
+            '[Event "B"]\n\n1. e4 *\n')
+    first, second = read_games(io.StringIO(text))
+    assert first.error is not None
+    assert second.error is None and len(second.moves) == 1
+
+
+def test_san_round_trip():
+    for fen in FENS:
+        position = Position.from_fen(fen)
+        for move in position.legal_moves():
+            assert parse_san(position, move_to_san(position, move)) == move
+
+
+def test_pgn_round_trip():
+    games = [(fen, random_game(fen, 60, seed))
+             for seed, fen in enumerate(FENS)]
+    text = "".join(
+        game_to_pgn(Position.from_fen(fen), moves, {"Round": i}, "*")
+        for i, (fen, moves) in enumerate(games))
+
+    read = list(read_games(io.StringIO(text)))
+    assert len(read) == len(games)
+    for i, ((fen, moves), game) in enumerate(zip(games, read)):
+        assert game.error is None
+        assert list(game.moves) == moves
+        assert game.headers["Round"] == str(i)
+        assert game.headers.get("FEN", START_FEN) == fen
+
+
+def test_pgn_game_without_moves():
+    text = ('[Event "A"]\n[White "Alice"]\n\n'
+            '[Event "B"]\n\n1. e4 e5 *\n')
+    first, second = read_games(io.StringIO(text))
+    assert first.headers == {"Event": "A", "White": "Alice"}
+    assert len(first.moves) == 0
+    assert second.headers == {"Event": "B"}
+    assert len(second.moves) == 2
+
+
+def test_pgn_tag_like_line_in_comment():
+    text = ('[Event "A"]\n\n1. e4 {a comment\n'
+            '[not a tag] still one} e5 2. Nf3 *\n')
+    games = list(read_games(io.StringIO(text)))
+    assert len(games) == 1
+    assert len(games[0].moves) == 3
+    assert games[0].error is None
@@ -0,0 +1,388 @@
+"""Texel tuning of the evaluation weights.
+
+Fits the weights of engine.evaluate to a set of positions labelled with
+the result of the game they are from, by minimizing the mean squared
+difference between the results and the win probabilities the evaluation
+predicts:
+
+    E = 1/N sum (result - sigmoid(score))^2,
+    sigmoid(s) = 1 / (1 + 10^(-K s / 400))
+
+The evaluation is linear in its weights once the game phase is known, so
+every position is turned into a sparse coefficient vector once and the
+loss and its gradient over the whole set are a few NumPy operations. The
+positions are split between worker processes, each of which keeps its
+share and computes its part of the gradient; the weights are then
+updated with Adam.
+
+Every line of the position file holds a FEN and the result, as
+"1-0"/"0-1"/"1/2-1/2" or "1.0"/"0.0"/"0.5", optionally in quotes or
+brackets (EPD files with c9 "1-0"; work too). Positions should be quiet;
+those with the side to move in check are skipped.
+
+    python tune.py positions.epd --iterations 2000 --output weights.json
+    python tune.py positions.epd --resume --output weights.json
+
+The output is a weights file the bot loads (see ChessBot). It is
+rewritten every --checkpoint-every iterations together with the state of
+the tuner, so that --resume can continue an interrupted run.
+"""
+
+import argparse
+import math
+import multiprocessing
+import re
+from time import perf_counter
+
+import numpy as np
+
+from engine import evaluate
+from engine.bitboard import WHITE, BLACK, PAWN, KING, BB_FILES, KING_ATTACKS, \
+    scan, popcount
+from engine.position import Position
+
+RESULT_REGEX = re.compile(
+    r"[\s;]*[\"\[]?(1-0|0-1|1/2-1/2|1\.0|0\.0|0\.5)[\"\]]?;?\s*$")
+RESULTS = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5,
+           "1.0": 1.0, "0.0": 0.0, "0.5": 0.5}
+
+# Adam
+BETA1 = 0.9
+BETA2 = 0.999
+EPSILON = 1e-8
+
+
+def _layout():
+    """Offset of every weight in the flat parameter vector, and its
+    length."""
+
+    offsets = {}
+    size = 0
+    for name, value in evaluate.get_weights().items():
+        offsets[name] = size
+        size += len(np.ravel(value))
+    return offsets, size
+
+
+OFFSETS, SIZE = _layout()
+
+
+def flatten(weights):
+    """Weights dict to a flat float vector."""
+    return np.concatenate([np.ravel(weights[name]).astype(np.float64)
+                           for name in OFFSETS])
+
+
+def unflatten(vector):
+    """Flat vector to a weights dict of (nested) lists, like
+    evaluate.get_weights()."""
+
+    weights = {}
+    for name, value in evaluate.get_weights().items():
+        start = OFFSETS[name]
+        shape = np.shape(value)
+        part = np.rint(vector[start:start + max(1, int(np.prod(shape)))])
+        weights[name] = part.astype(int).reshape(shape).tolist()
+    return weights
+
+
+def parse_line(line):
+    """Position and result of a line of the position file.
+
+    Raises:
+        ValueError: If the line has no result or a bad FEN.
+
+    """
+
+    match = RESULT_REGEX.search(line)
+    if not match:
+        raise ValueError(f"no result in line {line!r}")
+    fields = line[:match.start()].split()
+    # Clocks and EPD operations don't matter to the evaluation.
+    position = Position.from_fen(" ".join(fields[:4]))
+    return position, RESULTS[match.group(1)]
+
+
+def coefficients(position):
+    """The evaluation of the position as a linear function of the flat
+    weight vector.
+
+    Mirrors evaluate.evaluate(), but from white's point of view and with
+    the phase blending left unrounded.
+
+    Returns:
+        dict: Parameter index -> coefficient.
+
+    """
+
+    mg, eg = {}, {}
+
+    def add(terms, name, index, amount):
+        key = OFFSETS[name] + index
+        terms[key] = terms.get(key, 0) + amount
+
+    bitboards = position.bitboards
+    phase = 0
+    for sq, code in enumerate(position.squares):
+        if code is None:
+            continue
+        color, kind = code >> 3, code & 7
+        sign = 1 if color == WHITE else -1
+        index = 56 ^ sq if color == WHITE else sq
+        add(mg, "mg_values", kind, sign)
+        add(eg, "eg_values", kind, sign)
+        add(mg, "mg_tables", kind * 64 + index, sign)
+        add(eg, "eg_tables", kind * 64 + index, sign)
+        phase += evaluate.PHASE_WEIGHTS[kind]
+
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        pawns, enemy = bitboards[color][PAWN], bitboards[color ^ 1][PAWN]
+        for file in range(8):
+            count = popcount(pawns & BB_FILES[file])
+            if count > 1:
+                add(mg, "doubled_mg", 0, sign * (count - 1))
+                add(eg, "doubled_eg", 0, sign * (count - 1))
+            if count and not pawns & evaluate.ADJACENT_FILES[file]:
+                add(mg, "isolated_mg", 0, sign * count)
+                add(eg, "isolated_eg", 0, sign * count)
+        for sq in scan(pawns):
+            if not evaluate.PASSED_MASKS[color][sq] & enemy:
+                rank = sq >> 3 if color == WHITE else 7 - (sq >> 3)
+                add(mg, "passed_mg", rank, sign)
+                add(eg, "passed_eg", rank, sign)
+
+        own = position.occupied_co[color]
+        bbs = bitboards[color]
+        enemy_zone = KING_ATTACKS[bitboards[color ^ 1][KING].bit_length() - 1]
+        for sq in scan(own & ~bbs[PAWN] & ~bbs[KING]):
+            kind = position.squares[sq] & 7
+            targets = position.attacks[sq] & ~own
+            moves = popcount(targets) - evaluate.MOBILITY_AVERAGE[kind]
+            add(mg, "mobility_mg", kind, sign * moves)
+            add(eg, "mobility_eg", kind, sign * moves)
+            add(mg, "king_attack_weights", kind,
+                sign * popcount(targets & enemy_zone))
+
+        king_sq = bbs[KING].bit_length() - 1
+        shield = popcount(evaluate.SHIELD_MASKS[color][king_sq] & bbs[PAWN])
+        add(mg, "shield_bonus", 0, sign * shield)
+
+    phase = min(phase, evaluate.MAX_PHASE)
+    mg_share = phase / evaluate.MAX_PHASE
+    terms = {key: amount * mg_share for key, amount in mg.items() if amount}
+    for key, amount in eg.items():
+        if amount:
+            terms[key] = terms.get(key, 0) + amount * (1 - mg_share)
+    return terms
+
+
+def _worker(connection, lines):
+    """Keep a share of the positions and answer loss and gradient
+    requests for it, until None is received."""
+
+    rows, columns, values, results = [], [], [], []
+    skipped = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            position, result = parse_line(line)
+        except ValueError:
+            skipped += 1
+            continue
+        if position.in_check():
+            skipped += 1
+            continue
+        row = len(results)
+        for column, value in coefficients(position).items():
+            rows.append(row)
+            columns.append(column)
+            values.append(value)
+        results.append(result)
+
+    count = len(results)
+    rows = np.array(rows, dtype=np.int32)
+    columns = np.array(columns, dtype=np.int32)
+    values = np.array(values, dtype=np.float32)
+    results = np.array(results)
+    connection.send((count, skipped))
+
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        parameters, scale, gradient = request
+        scores = np.bincount(rows, values * parameters[columns],
+                             minlength=count)
+        predicted = 1 / (1 + 10 ** (-scale * scores / 400))
+        errors = results - predicted
+        loss = float(errors @ errors)
+        if not gradient:
+            connection.send((loss, None))
+            continue
+        slopes = (-2 * errors * predicted * (1 - predicted)
+                  * scale * math.log(10) / 400)
+        connection.send((loss, np.bincount(columns, values * slopes[rows],
+                                           minlength=SIZE)))
+    connection.close()
+
+
+class Tuner:
+    """The worker processes holding the positions.
+
+    Args:
+        lines (list): Lines of the position file.
+        workers (int): Number of worker processes.
+
+    """
+
+    def __init__(self, lines, workers):
+
+        self.connections = []
+        self.processes = []
+        share = max(1, -(-len(lines) // workers))  # No workers if empty
+        for start in range(0, len(lines), share):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker, args=(child, lines[start:start + share]),
+                daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+        self.count = self.skipped = 0
+        for connection in self.connections:
+            count, skipped = connection.recv()
+            self.count += count
+            self.skipped += skipped
+
+    def close(self):
+        for connection in self.connections:
+            connection.send(None)
+        for process in self.processes:
+            process.join()
+
+    def loss(self, parameters, scale, gradient=False):
+        """Mean squared error over all positions, and its gradient with
+        respect to the parameters if asked for."""
+
+        for connection in self.connections:
+            connection.send((parameters, scale, gradient))
+        loss, total = 0, np.zeros(SIZE)
+        for connection in self.connections:
+            part, part_gradient = connection.recv()
+            loss += part
+            if gradient:
+                total += part_gradient
+        if gradient:
+            return loss / self.count, total / self.count
+        return loss / self.count
+
+    def fit_scale(self, parameters, low=0.1, high=3.0, steps=30):
+        """K that minimizes the loss of the given weights (golden section
+        search)."""
+
+        ratio = (math.sqrt(5) - 1) / 2
+        for _ in range(steps):
+            a = high - ratio * (high - low)
+            b = low + ratio * (high - low)
+            if self.loss(parameters, a) < self.loss(parameters, b):
+                high = b
+            else:
+                low = a
+        return (low + high) / 2
+
+
+def save(path, parameters, state):
+    evaluate.save_weights(path, unflatten(parameters), loss=state["loss"],
+                          positions=state["positions"],
+                          tuner={**state,
+                                 "parameters": parameters.tolist(),
+                                 "m": state["m"].tolist(),
+                                 "v": state["v"].tolist()})
+
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("positions", help="file with a FEN and a result "
+                                          "on every line")
+    parser.add_argument("--output", default="weights.json",
+                        help="weights file to write")
+    parser.add_argument("--weights", default=None,
+                        help="weights file to start from, instead of the "
+                             "built-in weights")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the run checkpointed in --output")
+    parser.add_argument("--workers", type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="Adam learning rate, in weight units")
+    parser.add_argument("--scale", type=float, default=None,
+                        help="K of the sigmoid, fitted to the starting "
+                             "weights if not given")
+    parser.add_argument("--checkpoint-every", type=int, default=50)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+
+    args = parse_args(argv)
+
+    if args.resume:
+        state = evaluate.load_weights(args.output)["tuner"]
+        parameters = np.array(state.pop("parameters"))
+        state["m"] = np.array(state["m"])
+        state["v"] = np.array(state["v"])
+    else:
+        if args.weights:
+            evaluate.load_weights(args.weights)
+        parameters = flatten(evaluate.get_weights())
+        state = {"iteration": 0, "scale": args.scale, "rate": args.rate,
+                 "m": np.zeros(SIZE), "v": np.zeros(SIZE)}
+
+    with open(args.positions) as f:
+        lines = f.readlines()
+
+    start = perf_counter()
+    tuner = Tuner(lines, max(1, args.workers))
+    print(f"{tuner.count} positions ({tuner.skipped} skipped) "
+          f"loaded in {perf_counter() - start:.1f}s")
+    if not tuner.count:
+        tuner.close()
+        return 1
+    state["positions"] = tuner.count
+
+    try:
+        if state["scale"] is None:
+            state["scale"] = tuner.fit_scale(parameters)
+            print(f"K = {state['scale']:.4f}")
+        scale, rate = state["scale"], state["rate"]
+
+        state["loss"] = tuner.loss(parameters, scale)
+        print(f"iteration {state['iteration']}: loss {state['loss']:.6f}")
+
+        while state["iteration"] < args.iterations:
+            loss, gradient = tuner.loss(parameters, scale, gradient=True)
+            state["iteration"] += 1
+            t = state["iteration"]
+            state["m"] = BETA1 * state["m"] + (1 - BETA1) * gradient
+            state["v"] = BETA2 * state["v"] + (1 - BETA2) * gradient ** 2
+            m_hat = state["m"] / (1 - BETA1 ** t)
+            v_hat = state["v"] / (1 - BETA2 ** t)
+            parameters -= rate * m_hat / (np.sqrt(v_hat) + EPSILON)
+            state["loss"] = loss
+
+            if t % args.checkpoint_every == 0 or t == args.iterations:
+                save(args.output, parameters, state)
+                print(f"iteration {t}: loss {loss:.6f}, saved")
+    finally:
+        tuner.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
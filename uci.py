@@ -0,0 +1,276 @@
+"""UCI (Universal Chess Interface) front end for ChessBot.
+
+Speaks the protocol over stdin/stdout, so the bot can be run from chess
+GUIs and tournament tools (cutechess-cli, fastchess, ...):
+
+    python -m uci
+
+Supported: uci, isready, ucinewgame, setoption (Hash, Threads), position
+(startpos/fen with moves), go (depth, movetime, wtime/btime/winc/binc,
+movestogo, infinite), stop and quit. Searches run on a background thread,
+so commands are read and answered while the bot thinks.
+"""
+
+import sys
+import threading
+
+from ai import ChessBot, SearchHandle, load_weights
+from engine.bitboard import WHITE, QUEEN
+from engine.move import move_to_uci, parse_uci_squares
+from engine.position import Position
+from engine.search import MATE, MATE_BOUND
+
+NAME = "ChessBot"
+AUTHOR = "hjalmar02"
+
+# name: (type, default, min, max)
+OPTIONS = {
+    "Hash": ("spin", 16, 1, 4096),
+    "Threads": ("spin", 1, 1, 64),
+}
+
+# Time kept back for the protocol and the process scheduler, in ms
+MOVE_OVERHEAD = 30
+
+# Moves the remaining time is split over without movestogo
+MOVES_TO_GO = 30
+
+
+def score_to_uci(score):
+    """'cp <centipawns>' or 'mate <moves>' (negative if getting mated)."""
+    if score >= MATE_BOUND:
+        return f"mate {(MATE - score + 1) // 2}"
+    if score <= -MATE_BOUND:
+        return f"mate {-((MATE + score) // 2)}"
+    return f"cp {score}"
+
+
+def time_budget(position, params):
+    """Milliseconds to think from the go parameters, None if unlimited.
+
+    With a clock, an equal share of the remaining time over the moves to
+    go, plus most of the increment.
+    """
+
+    if "movetime" in params:
+        return max(1, params["movetime"] - MOVE_OVERHEAD)
+    side = "w" if position.turn == WHITE else "b"
+    if f"{side}time" not in params:
+        return None
+    remaining = params[f"{side}time"]
+    increment = params.get(f"{side}inc", 0)
+    moves_to_go = params.get("movestogo", MOVES_TO_GO)
+    budget = remaining / max(1, moves_to_go) + increment * 3 // 4
+    return max(1, int(min(budget, remaining / 2) - MOVE_OVERHEAD))
+
+
+class UCIEngine:
+    """Protocol state: options, the current position and the running
+    search.
+
+    Args:
+        output: File the responses are written to.
+
+    """
+
+    def __init__(self, output=sys.stdout):
+
+        self.output = output
+        self.lock = threading.Lock()  # The search thread writes too
+
+        self.options = {name: spec[1] for name, spec in OPTIONS.items()}
+        self.bot = None
+        # The bot is only made at isready or go, but its weights must be
+        # in place before the first position is set up.
+        load_weights()
+        self.position = Position.initial()
+        self.searching = None  # SearchHandle of the running search
+
+    def send(self, line):
+        with self.lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def _bot(self):
+        if self.bot is None:
+            self.bot = ChessBot("white", self.options["Hash"],
+                                self.options["Threads"], verbose=False)
+        return self.bot
+
+    def close(self):
+        self.stop()
+        if self.bot:
+            self.bot.close()
+            self.bot = None
+
+    def stop(self):
+        """End the running search, which then reports its move."""
+        if self.searching:
+            self.searching.stop()
+            self.searching.result()
+            self.searching = None
+
+    def handle(self, line):
+        """Process one command line.
+
+        Returns:
+            bool: False after quit.
+
+        """
+
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+
+        if command == "uci":
+            self.send(f"id name {NAME}")
+            self.send(f"id author {AUTHOR}")
+            for name, (kind, default, low, high) in OPTIONS.items():
+                self.send(f"option name {name} type {kind} default {default}"
+                          f" min {low} max {high}")
+            self.send("uciok")
+        elif command == "isready":
+            self._bot()
+            self.send("readyok")
+        elif command == "setoption":
+            self.stop()
+            self.set_option(args)
+        elif command == "ucinewgame":
+            self.stop()
+            if self.bot:
+                self.bot.searcher.clear()
+        elif command == "position":
+            self.stop()
+            self.set_position(args)
+        elif command == "go":
+            self.stop()
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            self.close()
+            return False
+        else:
+            self.send(f"info string unknown command {command}")
+        return True
+
+    def set_option(self, args):
+        """setoption name <name> value <value>"""
+
+        if "name" not in args or "value" not in args:
+            return
+        name = " ".join(args[args.index("name") + 1:args.index("value")])
+        value = " ".join(args[args.index("value") + 1:])
+        for option, (kind, default, low, high) in OPTIONS.items():
+            if option.lower() == name.lower():
+                try:
+                    self.options[option] = min(high, max(low, int(value)))
+                except ValueError:
+                    self.send(f"info string bad value for {option}: {value}")
+                    return
+                # The bot is set up again with the new option.
+                if self.bot:
+                    self.bot.close()
+                    self.bot = None
+                return
+        self.send(f"info string unknown option {name}")
+
+    def set_position(self, args):
+        """position (startpos | fen <fen>) [moves <move> ...]"""
+
+        moves = []
+        if "moves" in args:
+            moves = args[args.index("moves") + 1:]
+            args = args[:args.index("moves")]
+
+        try:
+            if args[:1] == ["startpos"]:
+                position = Position.initial()
+            elif args[:1] == ["fen"]:
+                position = Position.from_fen(" ".join(args[1:]))
+            else:
+                raise ValueError(f"bad position command: {args}")
+            for uci in moves:
+                frm, to, promo = parse_uci_squares(uci)
+                move = position.find_move(frm, to, promo or QUEEN)
+                if move is None:
+                    raise ValueError(f"illegal move {uci}")
+                position.make_move(move)
+        except (ValueError, IndexError) as error:
+            self.send(f"info string {error}")
+            return
+        self.position = position
+
+    def go(self, args):
+        """go [depth <n>] [movetime <ms>] [wtime <ms>] [btime <ms>]
+        [winc <ms>] [binc <ms>] [movestogo <n>] [infinite]"""
+
+        params = {}
+        for name, value in zip(args, args[1:]):
+            if name in ("depth", "movetime", "wtime", "btime", "winc",
+                        "binc", "movestogo"):
+                try:
+                    params[name] = int(value)
+                except ValueError:
+                    pass
+        infinite = "infinite" in args
+        time_ms = None if infinite else time_budget(self.position, params)
+        depth = params.get("depth")
+
+        bot = self._bot()
+
+        def search(position, time_ms, depth, stop, progress):
+            move = bot.search(position, time_ms, depth, stop, progress)
+            # Infinite searches only report their move once stopped.
+            if infinite:
+                stop.wait()
+            self.report(position, move, bot.last_search)
+            return move
+
+        self.searching = SearchHandle(search, self.position, time_ms,
+                                      depth, self.info)
+
+    def info(self, result):
+        """Progress of the search, after every iteration."""
+        pv = move_to_uci(result.move)
+        if result.ponder:
+            pv += " " + move_to_uci(result.ponder)
+        # Only a serial search has its table in this process.
+        tt = getattr(self.bot.searcher, "tt", None)
+        hashfull = f" hashfull {tt.hashfull()}" if tt is not None else ""
+        self.send(f"info depth {result.depth} score "
+                  f"{score_to_uci(result.score)} nodes {result.nodes} "
+                  f"nps {result.nps}{hashfull} time {int(result.time * 1000)}"
+                  f" pv {pv}")
+
+    def report(self, position, move, result):
+        """The bestmove line, with the expected reply as ponder move if
+        the search found one."""
+
+        if move is None:
+            self.send("bestmove 0000")
+            return
+        line = f"bestmove {move_to_uci(move)}"
+        if result is not None and result.ponder is not None:
+            position.make_move(move)
+            if result.ponder in position.legal_moves():
+                line += f" ponder {move_to_uci(result.ponder)}"
+            position.unmake_move()
+        self.send(line)
+
+
+def main():
+
+    engine = UCIEngine()
+    try:
+        for line in sys.stdin:
+            if not engine.handle(line):
+                break
+    finally:
+        engine.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())